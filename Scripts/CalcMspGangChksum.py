@@ -34,7 +34,7 @@
 #
 # Author:      Leo Hendrawan
 #
-# Version:     0.3
+# Version:     0.4
 #
 # Licence:     BSD license
 #
@@ -45,6 +45,14 @@
 # Log:
 #     - Version 0.3 (2013.06.29) :
 #       Hello World! (created)
+#     - Version 0.4 (2026.10.18) :
+#       * checksum is calculated while streaming the TI-TXT records, input
+#         can be read from stdin
+#       * adding parse cache options
+#       * checksum is calculated with MspGangChecksum class of TiTxtChecksum
+#         module which sums whole buffers
+#       * with parse cache, the memoized segment checksums of the parsed
+#         content are used
 #
 #===============================================================================
 #!/usr/bin/env python
@@ -52,6 +60,8 @@
 import sys
 import optparse
 from TiTxtParser import TiTxtParser
+import TiTxtCache
+from TiTxtChecksum import MspGangChecksum, CHKSUM_MSP_GANG
 
 #===============================================================================
 # Constants
@@ -60,37 +70,44 @@ from TiTxtParser import TiTxtParser
 #===============================================================================
 # Calculate MSP-GANG Checksum function
 #===============================================================================
-def CalcMspGangChksum(file_name, verbose):
+def CalcMspGangChksum(file_name, verbose, cache=None):
     # create new instance of TI-TXT class
-    ti_txt = TiTxtParser(verbose)
+    ti_txt = TiTxtParser(verbose, cache)
 
-    # parse the TI-TXT
-    content = ti_txt.parse(file_name)
-    if(content == {}):
-        if(verbose == True):
-            print "Failed to parse TI-TXT file:", file_name
-        return None
-
-    # calculate the checksum
+    # calculate the checksum while parsing the TI-TXT records
     if(verbose == True):
         print "\n== Calculating MSP-GANG CS =="
-    cs = 0
-    start_addresses = content.keys()
-    start_addresses.sort()
-    for start_addr in start_addresses:
-        i = 0
-        for byte in content[start_addr]:
-            if (i == 0):
-                cs = cs + byte
-                i = 1
+    if((cache != None) and (file_name != '-')):
+        # sum the memoized segment checksums of the (cached) parsed content
+        ti_txt.set_checksum_algorithms([CHKSUM_MSP_GANG])
+        content = ti_txt.parse(file_name)
+        if(content == {}):
+            if(verbose == True):
+                print "Failed to parse TI-TXT file:", file_name
+            return None
+        return sum([content.get_segment_checksum(addr, CHKSUM_MSP_GANG)
+            for addr in content.sorted_addrs()])
+
+    cs = MspGangChecksum()
+    num_of_records = 0
+    try:
+        for (addr, data) in ti_txt.iter_records(file_name):
+            num_of_records += 1
+            if(len(data) == 0):
+                # new section - fill up the last word of previous section
+                cs.new_section()
             else:
-                cs = cs + (byte * 256)
-                i = 0
-        if(i == 1):
-            cs = cs + (0xFF * 256)
+                cs.update(data)
+    except (IOError, ValueError):
+        num_of_records = 0
+
+    if(num_of_records == 0):
+        if(verbose == True):
+            print "Failed to parse TI-TXT file:", file_name
+        return None
 
     # return the calculated checksum
-    return cs
+    return cs.get_checksum()
 
 
 #===============================================================================
@@ -100,10 +117,12 @@ if __name__ == '__main__':
     #parse the command line parameters using OptionParser
     cmd_line_parser = optparse.OptionParser()
     cmd_line_parser.add_option("-f", "--file", action="store", type="string",
-            dest="file_name", help="TI-TXT input file with name FILE",
+            dest="file_name",
+            help="TI-TXT input file with name FILE ('-' for stdin)",
             metavar="FILE")
     cmd_line_parser.add_option("-v", "--verbose", action="store_true",
             dest="verbose", help="activate verbose mode")
+    TiTxtCache.add_cache_options(cmd_line_parser)
     (options, args) = cmd_line_parser.parse_args()
 
     # check given input file name parameter
@@ -113,7 +132,8 @@ if __name__ == '__main__':
         sys.exit(1)
 
     # calculate checksum
-    cs = CalcMspGangChksum(options.file_name, options.verbose)
+    cs = CalcMspGangChksum(options.file_name, options.verbose,
+        TiTxtCache.get_cache(options, options.verbose))
 
     # check for valid cs
     if(cs == None):
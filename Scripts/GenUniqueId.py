@@ -35,35 +35,162 @@
 #
 # Author:      Leo Hendrawan
 #
-# Version:     0.3
+# Version:     0.4
 #
 # Licence:     BSD license
 #
-# Note:        The script will modify the last byte of six bytes ID number 
+# Note:        The script will modify the last byte(s) of six bytes ID number
 #              located starting address 0x1000
 #
 #
 # Log:
 #     - Version 0.3 (2013.06.29) :
 #       Hello World! (created)
+#     - Version 0.4 (2026.10.18) :
+#       * adding parse cache options
+#       * the input image is formatted only once, the output files are
+#         generated by replacing the ID digits in the formatted text. The
+#         input content is not modified anymore
+#       * adding multi byte counter and start counter value options
+#       * output files can be generated in parallel with a process pool,
+#         adding throughput summary
+#       * output images can be written into one tar, zip or bundle archive
+#         file, adding read_archive_image() for reading one image by its
+#         counter value
+#       * the member index of tar and zip archives is built once per archive
+#         and cached, the images are read directly at their offsets
 #
 #===============================================================================
 #!/usr/bin/env python
 
 import sys
+import os
 import optparse
-from TiTxtParser import TiTxtParser
+import StringIO
+import time
+import multiprocessing
+import struct
+import tarfile
+import zipfile
+from TiTxtParser import TiTxtParser, TiTxtWriter, BYTES_PER_LINE
+import TiTxtCache
 
 #===============================================================================
 # Constants
 #===============================================================================
+# address and length of the unique ID
+ID_ADDR = 0x1000
+ID_LEN = 6
+
+# archive formats for writing all output images into one file
+ARCHIVE_TAR = "tar"
+ARCHIVE_ZIP = "zip"
+ARCHIVE_BUNDLE = "bundle"
+ARCHIVE_FORMATS = [ARCHIVE_TAR, ARCHIVE_ZIP, ARCHIVE_BUNDLE]
+
+# bundle file: magic, entries (entry header + TI-TXT text), index of
+# (counter value, entry offset) sorted by counter value, trailer
+BUNDLE_MAGIC = "TIBNDL01"
+BUNDLE_ENTRY_HEADER = struct.Struct("<QI")
+BUNDLE_INDEX_ENTRY = struct.Struct("<QQ")
+BUNDLE_TRAILER = struct.Struct("<Q8s")
+
+# member index of the tar and zip archives read by read_archive_text():
+# absolute archive name -> (size, mtime, {member name: (offset, size)})
+archive_index_cache = {}
+
+# template used by the process pool workers, set by init_worker()
+worker_template = None
+
+# hex digits of all byte values as written in TI-TXT file
+HEX_DIGITS = ["%02x" % byte for byte in range(256)]
+
+#===============================================================================
+# TI-TXT template class - TI-TXT text of an image in which the counter bytes
+# of the unique ID can be replaced
+#===============================================================================
+class UniqueIdTemplate:
+    #---------------------------------------------------------------------------
+    # The image is formatted only once. The counter is stored big endian in the
+    # last counter_len bytes of the ID, for every counter value only the hex
+    # digits of these bytes are replaced in the text.
+    #---------------------------------------------------------------------------
+
+    #---------------------------------------------------------------------------
+    # init function - instantiation operation
+    #---------------------------------------------------------------------------
+    def __init__(self, content, counter_len=1, id_addr=ID_ADDR, id_len=ID_LEN):
+        self.id_addr = id_addr
+        self.counter_len = counter_len
+        self.id_bytes = bytearray(id_len)
+        # text offsets of the hex digits of the counter bytes (MSB first)
+        self.offsets = []
+
+        # format the content and save the text offset of the data of each
+        # segment
+        text = StringIO.StringIO()
+        writer = TiTxtWriter(text)
+        writer.open()
+        seg_offsets = {}
+        for addr in sorted(content.keys()):
+            writer.write_segment(addr, bytearray())
+            seg_offsets[addr] = text.tell()
+            writer.write_segment(addr, content[addr])
+        writer.close()
+        self.text = bytearray(text.getvalue())
+
+        # find the text offsets of the ID bytes
+        for idx in range(id_len):
+            addr = id_addr + idx
+            seg_addr = content.find_segment(addr)
+            if(seg_addr == None):
+                raise KeyError("ID byte not found: " + hex(addr))
+            self.id_bytes[idx] = content[seg_addr][addr - seg_addr]
+            if(idx >= (id_len - counter_len)):
+                (line, col) = divmod(addr - seg_addr, BYTES_PER_LINE)
+                self.offsets.append(seg_offsets[seg_addr] +
+                    (line * (3 * BYTES_PER_LINE + 1)) + (col * 3))
+
+    #---------------------------------------------------------------------------
+    # get maximum counter value + 1
+    #---------------------------------------------------------------------------
+    def get_max_count(self):
+        return 256 ** self.counter_len
+
+    #---------------------------------------------------------------------------
+    # get the ID bytes for the given counter value
+    #---------------------------------------------------------------------------
+    def get_id(self, count):
+        id_bytes = bytearray(self.id_bytes)
+        for idx in range(self.counter_len):
+            id_bytes[len(id_bytes) - 1 - idx] = (count >> (8 * idx)) & 0xFF
+        return id_bytes
+
+    #---------------------------------------------------------------------------
+    # get the TI-TXT text for the given counter value. The returned bytearray
+    # is reused for the next call
+    #---------------------------------------------------------------------------
+    def render(self, count):
+        shift = 8 * (self.counter_len - 1)
+        for offset in self.offsets:
+            self.text[offset:(offset + 2)] = HEX_DIGITS[(count >> shift) & 0xFF]
+            shift -= 8
+        return self.text
+
+#---------------------------------------------------------------------------
+# get output file name for the given counter value, e.g. out-3.txt
+#---------------------------------------------------------------------------
+def get_output_file_name(out_file, count):
+    (root, ext) = os.path.splitext(out_file)
+    return root + "-" + str(count) + ext
 
 #===============================================================================
 # Generate Output files with unique ID
 #===============================================================================
-def GenUniqueId(in_file, out_file, num_of_output, verbose):
+def GenUniqueId(in_file, out_file, num_of_output, verbose, cache=None,
+        counter_len=1, start=0, jobs=None, summary=False, archive_format=None):
     # create new instance of TI-TXT class
-    ti_txt = TiTxtParser(verbose)
+    ti_txt = TiTxtParser(verbose, cache)
 
     # parse the TI-TXT
     content = ti_txt.parse(in_file)
@@ -72,32 +199,324 @@ def GenUniqueId(in_file, out_file, num_of_output, verbose):
             print "Failed to parse TI-TXT file:", in_file
         return None
 
-    # check if the ID fields is available
+    # check if the ID fields is available, and format the content once
     try:
-        if((len(content[0x1000]) == 6) and (verbose == True)):
-            print "6 bytes Unique ID starting at address 0x1000 is found"
-    except:
+        template = UniqueIdTemplate(content, counter_len)
+    except KeyError:
         if(verbose == True):
             print "No Unique ID starting at address 0x1000 is found"
-            return False
-    
-    
+        return False
+    if(verbose == True):
+        print "6 bytes Unique ID starting at address 0x1000 is found"
+    if((start < 0) or (start + num_of_output > template.get_max_count())):
+        if(verbose == True):
+            print "Counter values don't fit in", counter_len, "byte(s)"
+        return False
+
     # start creating files
     if(verbose == True):
         print "\n== Generating output file with Unique ID =="
-    for i in range(0, num_of_output):
-      file_name = out_file.split('.')[0] + "-" + str(i) + "." + out_file.split('.')[1]
-      temp = content
-      temp[0x1000][5] = i
-      if(verbose == True):
-          id = temp[0x1000]
-          id_string = hex(id[0]) + ":" + hex(id[1]) + ":" + hex(id[2]) + ":" + \
-              hex(id[3]) + ":" + hex(id[4]) + ":" + hex(id[5])
-          print "\nOutput file name: ", file_name, " - ID: ", id_string
-      ti_txt.print_ti_txt(file_name, temp)
-      
+    start_time = time.time()
+    if(archive_format != None):
+        # the archive is written sequentially by this process, jobs is ignored
+        if((verbose == True) and (jobs != None) and (jobs > 1)):
+            print "Archive is written by a single process, jobs is ignored"
+        results = [GenUniqueIdArchive(template, out_file, archive_format,
+            start, start + num_of_output, verbose)]
+    elif((jobs != None) and (jobs > 1) and (num_of_output > 1)):
+        # split the counter range into one shard per process
+        jobs = min(jobs, num_of_output)
+        tasks = []
+        for idx in range(jobs):
+            tasks.append((out_file, start + (num_of_output * idx) // jobs,
+                start + (num_of_output * (idx + 1)) // jobs, verbose))
+        pool = multiprocessing.Pool(jobs, init_worker, (template,))
+        try:
+            results = pool.map(gen_files_worker, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [GenUniqueIdFiles(template, out_file, start,
+            start + num_of_output, verbose)]
+    duration = time.time() - start_time
+
+    # sum up the results of the shards
+    num_of_files = 0
+    num_of_bytes = 0
+    for result in results:
+        if(result == None):
+            return False
+        num_of_files += result[0]
+        num_of_bytes += result[1]
+    if(summary == True):
+        print_summary(num_of_files, num_of_bytes, duration)
+
     return True
 
+#---------------------------------------------------------------------------
+# write output files for counter values from start to stop - 1, returns
+# (number of files, number of bytes), or None in case of error
+#---------------------------------------------------------------------------
+def GenUniqueIdFiles(template, out_file, start, stop, verbose):
+    num_of_bytes = 0
+    for i in range(start, stop):
+        file_name = get_output_file_name(out_file, i)
+        if(verbose == True):
+            id_string = ":".join([hex(byte) for byte in template.get_id(i)])
+            print "\nOutput file name: ", file_name, " - ID: ", id_string
+        try:
+            text = template.render(i)
+            file = open(file_name, 'w')
+            try:
+                file.write(text)
+            finally:
+                file.close()
+        except IOError:
+            if(verbose == True):
+                print "Failed to write file:", file_name
+            return None
+        num_of_bytes += len(text)
+    return (stop - start, num_of_bytes)
+
+#---------------------------------------------------------------------------
+# get archive member name for the given counter value, e.g. out-3.txt for
+# archive out.zip
+#---------------------------------------------------------------------------
+def get_member_name(archive_name, count):
+    root = os.path.splitext(os.path.basename(archive_name))[0]
+    return get_output_file_name(root + ".txt", count)
+
+#---------------------------------------------------------------------------
+# get archive format from archive file name extension, None if unknown
+#---------------------------------------------------------------------------
+def get_archive_format(archive_name):
+    ext = os.path.splitext(archive_name)[1].lstrip('.').lower()
+    if(ext in ARCHIVE_FORMATS):
+        return ext
+    return None
+
+#---------------------------------------------------------------------------
+# write output images for counter values from start to stop - 1 into one
+# archive file, returns (number of images, number of bytes), or None in case
+# of error
+#---------------------------------------------------------------------------
+def GenUniqueIdArchive(template, archive_name, archive_format, start, stop,
+        verbose):
+    if(verbose == True):
+        print "Writing", archive_format, "archive:", archive_name
+    num_of_bytes = 0
+    try:
+        if(archive_format == ARCHIVE_TAR):
+            archive = tarfile.open(archive_name, 'w')
+            mtime = time.time()
+        elif(archive_format == ARCHIVE_ZIP):
+            archive = zipfile.ZipFile(archive_name, 'w', zipfile.ZIP_STORED,
+                True)
+        else:
+            archive = open(archive_name, 'wb')
+            archive.write(BUNDLE_MAGIC)
+            index = []
+        try:
+            for i in range(start, stop):
+                text = template.render(i)
+                if(archive_format == ARCHIVE_TAR):
+                    info = tarfile.TarInfo(get_member_name(archive_name, i))
+                    info.size = len(text)
+                    info.mtime = mtime
+                    archive.addfile(info, StringIO.StringIO(str(text)))
+                elif(archive_format == ARCHIVE_ZIP):
+                    archive.writestr(get_member_name(archive_name, i),
+                        str(text))
+                else:
+                    index.append(BUNDLE_INDEX_ENTRY.pack(i, archive.tell()))
+                    archive.write(BUNDLE_ENTRY_HEADER.pack(i, len(text)))
+                    archive.write(text)
+                num_of_bytes += len(text)
+
+            # write index and trailer of bundle file
+            if(archive_format == ARCHIVE_BUNDLE):
+                index_offset = archive.tell()
+                archive.write("".join(index))
+                archive.write(BUNDLE_TRAILER.pack(index_offset, BUNDLE_MAGIC))
+        finally:
+            archive.close()
+    except (IOError, OSError, tarfile.TarError, zipfile.BadZipfile):
+        if(verbose == True):
+            print "Failed to write archive:", archive_name
+        return None
+    return (stop - start, num_of_bytes)
+
+#---------------------------------------------------------------------------
+# find entry of the given counter value in bundle file with binary search
+# over the index, returns TI-TXT text or None if not found
+#---------------------------------------------------------------------------
+def read_bundle_entry(file, count):
+    # read the trailer
+    file.seek(0, os.SEEK_END)
+    file_size = file.tell()
+    file.seek(file_size - BUNDLE_TRAILER.size)
+    (index_offset, magic) = BUNDLE_TRAILER.unpack(
+        file.read(BUNDLE_TRAILER.size))
+    if(magic != BUNDLE_MAGIC):
+        return None
+
+    # binary search over the index entries
+    low = 0
+    high = (file_size - BUNDLE_TRAILER.size - index_offset) // \
+        BUNDLE_INDEX_ENTRY.size
+    while(low < high):
+        mid = (low + high) // 2
+        file.seek(index_offset + (mid * BUNDLE_INDEX_ENTRY.size))
+        (entry_count, offset) = BUNDLE_INDEX_ENTRY.unpack(
+            file.read(BUNDLE_INDEX_ENTRY.size))
+        if(entry_count < count):
+            low = mid + 1
+        elif(entry_count > count):
+            high = mid
+        else:
+            file.seek(offset)
+            (entry_count, length) = BUNDLE_ENTRY_HEADER.unpack(
+                file.read(BUNDLE_ENTRY_HEADER.size))
+            return file.read(length)
+    return None
+
+#---------------------------------------------------------------------------
+# get index of the uncompressed members of tar or zip archive: member name ->
+# (data offset, size). The index is built once and cached until the archive
+# file changes. Returns None if the archive can't be indexed (e.g. compressed
+# tar archive)
+#---------------------------------------------------------------------------
+def get_archive_index(archive_name, archive_format):
+    stat = os.stat(archive_name)
+    key = os.path.abspath(archive_name)
+    cached = archive_index_cache.get(key)
+    if((cached != None) and (cached[0] == stat.st_size) and
+            (cached[1] == stat.st_mtime)):
+        return cached[2]
+
+    index = {}
+    if(archive_format == ARCHIVE_TAR):
+        try:
+            archive = tarfile.open(archive_name, 'r:')
+        except tarfile.ReadError:
+            return None
+        try:
+            for info in archive:
+                if(info.isfile()):
+                    index[info.name] = (info.offset_data, info.size)
+        finally:
+            archive.close()
+    else:
+        archive = zipfile.ZipFile(archive_name, 'r')
+        try:
+            for info in archive.infolist():
+                if(info.compress_type != zipfile.ZIP_STORED):
+                    continue
+                # the data follows the local header with name and extra field
+                archive.fp.seek(info.header_offset)
+                header = struct.unpack(zipfile.structFileHeader,
+                    archive.fp.read(zipfile.sizeFileHeader))
+                index[info.filename] = (info.header_offset +
+                    zipfile.sizeFileHeader + header[10] + header[11],
+                    info.file_size)
+        finally:
+            archive.close()
+
+    archive_index_cache[key] = (stat.st_size, stat.st_mtime, index)
+    return index
+
+#---------------------------------------------------------------------------
+# read TI-TXT text of the image with the given counter value from archive
+# file (format detected from file name extension if not given), returns
+# None if not found. Bundle files are searched with their index, tar and zip
+# archives with the cached member index (see get_archive_index())
+#---------------------------------------------------------------------------
+def read_archive_text(archive_name, count, archive_format=None):
+    if(archive_format == None):
+        archive_format = get_archive_format(archive_name)
+    try:
+        if(archive_format in [ARCHIVE_TAR, ARCHIVE_ZIP]):
+            index = get_archive_index(archive_name, archive_format)
+            member_name = get_member_name(archive_name, count)
+            if((index != None) and (member_name in index)):
+                (offset, size) = index[member_name]
+                file = open(archive_name, 'rb')
+                try:
+                    file.seek(offset)
+                    return file.read(size)
+                finally:
+                    file.close()
+            if((index != None) and (archive_format == ARCHIVE_TAR)):
+                # all members of the tar archive are indexed
+                return None
+
+        # members which are not indexed (compressed) are read by the modules
+        if(archive_format == ARCHIVE_TAR):
+            archive = tarfile.open(archive_name, 'r')
+            try:
+                member = archive.extractfile(get_member_name(archive_name,
+                    count))
+                return member.read()
+            finally:
+                archive.close()
+        elif(archive_format == ARCHIVE_ZIP):
+            # the member is found with the central directory of the archive
+            archive = zipfile.ZipFile(archive_name, 'r')
+            try:
+                return archive.read(get_member_name(archive_name, count))
+            finally:
+                archive.close()
+        elif(archive_format == ARCHIVE_BUNDLE):
+            file = open(archive_name, 'rb')
+            try:
+                return read_bundle_entry(file, count)
+            finally:
+                file.close()
+    except (IOError, OSError, KeyError, struct.error, tarfile.TarError,
+            zipfile.BadZipfile):
+        pass
+    return None
+
+#---------------------------------------------------------------------------
+# read the image with the given counter value from archive file, returns
+# parsed content or {} if not found
+#---------------------------------------------------------------------------
+def read_archive_image(archive_name, count, archive_format=None,
+        verbose=False):
+    text = read_archive_text(archive_name, count, archive_format)
+    if(text == None):
+        if(verbose == True):
+            print "Image", count, "not found in archive:", archive_name
+        return {}
+    return TiTxtParser(verbose).parse(StringIO.StringIO(text))
+
+#---------------------------------------------------------------------------
+# print throughput summary
+#---------------------------------------------------------------------------
+def print_summary(num_of_files, num_of_bytes, duration):
+    duration = max(duration, 1e-6)
+    print "\n ", num_of_files, "files,", num_of_bytes, "bytes in",
+    print "%.3f s - %.1f files/s, %.2f MB/s" % (duration,
+        num_of_files / duration, num_of_bytes / (duration * 1024 * 1024))
+
+#---------------------------------------------------------------------------
+# process pool initializer: save the template in the pool process. The
+# template is passed once per process (on Windows the processes aren't forked,
+# so it is pickled and sent to every process), not once per task
+#---------------------------------------------------------------------------
+def init_worker(template):
+    global worker_template
+    worker_template = template
+
+#---------------------------------------------------------------------------
+# process pool worker for GenUniqueId(), task is (out_file, start, stop,
+# verbose)
+#---------------------------------------------------------------------------
+def gen_files_worker(task):
+    (out_file, start, stop, verbose) = task
+    return GenUniqueIdFiles(worker_template, out_file, start, stop, verbose)
+
 
 #===============================================================================
 # main script
@@ -116,6 +535,24 @@ if __name__ == '__main__':
     cmd_line_parser.add_option("-n", "--num", action="store", type="int",
             dest="num_output", help="number of output files",
             metavar="NUM_OUTPUT")
+    cmd_line_parser.add_option("-c", "--counter-len", action="store",
+            type="int", dest="counter_len", default=1,
+            help="number of ID bytes used as counter (default: 1)",
+            metavar="COUNTER_LEN")
+    cmd_line_parser.add_option("-s", "--start", action="store", type="int",
+            dest="start", default=0,
+            help="counter value of the first output file (default: 0)",
+            metavar="START")
+    cmd_line_parser.add_option("--jobs", action="store", type="int",
+            dest="jobs",
+            help="generate output files in parallel with JOBS processes " +
+            "(not with --archive)",
+            metavar="JOBS")
+    cmd_line_parser.add_option("-a", "--archive", action="store",
+            type="choice", choices=ARCHIVE_FORMATS, dest="archive_format",
+            help="write all output images into archive OUT_FILE with format " +
+            "ARCHIVE: " + ", ".join(ARCHIVE_FORMATS), metavar="ARCHIVE")
+    TiTxtCache.add_cache_options(cmd_line_parser)
     (options, args) = cmd_line_parser.parse_args()
 
     # check given input file name parameter
@@ -131,10 +568,16 @@ if __name__ == '__main__':
         print ("Number of output file is missing!")
         cmd_line_parser.print_help()
         sys.exit(1)
+    if((options.archive_format != None) and (options.jobs != None) and
+            (options.jobs > 1)):
+        print "WARNING: --jobs is ignored when writing an archive"
 
     # calculate checksum
     ret = GenUniqueId(options.in_file_name, options.out_file_name,
-                      options.num_output, options.verbose)
+                      options.num_output, options.verbose,
+                      TiTxtCache.get_cache(options, options.verbose),
+                      options.counter_len, options.start, options.jobs, True,
+                      options.archive_format)
 
     # check for valid cs
     if(ret != True):
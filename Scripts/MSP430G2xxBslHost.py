@@ -34,7 +34,7 @@
 #
 # Author:      Leo Hendrawan
 #
-# Version:     0.3
+# Version:     0.4
 #
 # Licence:     BSD license
 #
@@ -48,6 +48,12 @@
 #     - Version 0.3 (2013.06.29) :
 #       * name changed to MSP430G2xxBslHost
 #       * some type bug fixes
+#     - Version 0.4 (2026.10.18) :
+#       * checksum is calculated with TiTxtChecksum module
+#       * data is sent with pacing derived from the baud rate, by default
+#         byte by byte with 5 ms gap as before, in chunks with --byte-gap 0.
+#         Adding baud rate, stop bits, chunk time, byte gap and hardware flow
+#         control options
 #
 #===============================================================================
 #!/usr/bin/env python
@@ -57,6 +63,7 @@ import optparse
 import time
 import serial
 from TiTxtParser import TiTxtParser
+from TiTxtChecksum import xor_checksum
 
 
 #===============================================================================
@@ -67,6 +74,21 @@ ACK = 0xF8
 NACK = 0xFE
 SLEEP_1MS = 0.001 # 1ms
 
+# default serial settings (pyserial defaults as in former versions)
+DEFAULT_BAUD_RATE = 9600
+DEFAULT_STOP_BITS = 1
+
+# default target write time of one chunk (in seconds)
+DEFAULT_CHUNK_TIME = 0.05
+
+# default extra idle time after every byte (in seconds), bytes are sent one
+# by one if it's not zero. The BSL receives with a software UART and writes
+# every received byte into flash before it can receive the next one. Former
+# versions slept 5 ms after every byte, smaller gaps (--byte-gap) or two stop
+# bits (--stop-bits 2) instead haven't been measured on hardware yet, so the
+# 5 ms are kept as default
+DEFAULT_BYTE_GAP = 0.005
+
 #===============================================================================
 # MSP430G2xxBslHost class
 #===============================================================================
@@ -82,6 +104,15 @@ class MSP430G2xxBslHost:
     serial_port = ""
     # start address of device target flash memory
     start_addr = 0
+    # serial settings
+    baud_rate = DEFAULT_BAUD_RATE
+    stop_bits = DEFAULT_STOP_BITS
+    rtscts = False
+    # pacing of the data transmission (in seconds)
+    chunk_time = DEFAULT_CHUNK_TIME
+    byte_gap = DEFAULT_BYTE_GAP
+    # effective data rate of the last transmission in bytes/s
+    bytes_per_sec = 0
 
     #---------------------------------------------------------------------------
     # Class functions
@@ -115,6 +146,62 @@ class MSP430G2xxBslHost:
     def set_verbose_mode(self, verbose):
         self.verbose_mode = verbose
 
+    #---------------------------------------------------------------------------
+    # setting serial settings: baud rate, number of stop bits (1 or 2) and
+    # hardware flow control
+    #---------------------------------------------------------------------------
+    def set_serial_settings(self, baud_rate, stop_bits, rtscts):
+        self.baud_rate = baud_rate
+        self.stop_bits = stop_bits
+        self.rtscts = rtscts
+
+    #---------------------------------------------------------------------------
+    # setting pacing: target write time of one chunk and extra idle time after
+    # every byte (in seconds)
+    #---------------------------------------------------------------------------
+    def set_pacing(self, chunk_time, byte_gap):
+        self.chunk_time = chunk_time
+        self.byte_gap = byte_gap
+
+    #---------------------------------------------------------------------------
+    # get transmission time of one byte (in seconds) on the serial line:
+    # start bit, 8 data bits and stop bit(s), plus the byte gap
+    #---------------------------------------------------------------------------
+    def get_byte_time(self):
+        return (float(1 + 8 + self.stop_bits) / self.baud_rate) + self.byte_gap
+
+    #---------------------------------------------------------------------------
+    # send data in chunks. The chunks are written according to a schedule of
+    # one byte time per byte, so the host never runs ahead of the serial line
+    # (no pacing with hardware flow control). Returns transmission time
+    #---------------------------------------------------------------------------
+    def send_paced(self, ser, data):
+        byte_time = self.get_byte_time()
+        if(self.byte_gap > 0):
+            chunk_size = 1
+        else:
+            chunk_size = max(1, int(self.chunk_time / byte_time))
+        if(self.verbose_mode == True):
+            print "Sending", len(data), "bytes in chunks of", chunk_size,
+            print "bytes"
+
+        start_time = time.time()
+        for idx in xrange(0, len(data), chunk_size):
+            chunk = data[idx:(idx + chunk_size)]
+            ser.write(str(chunk))
+            if(self.rtscts != True):
+                # wait until the chunk has been sent on the serial line
+                delay = (start_time + ((idx + len(chunk)) * byte_time) -
+                    time.time())
+                if(delay > 0):
+                    time.sleep(delay)
+        ser.flush()
+        duration = time.time() - start_time
+
+        if(duration > 0):
+            self.bytes_per_sec = len(data) / duration
+        return duration
+
     #---------------------------------------------------------------------------
     # flash target device
     #---------------------------------------------------------------------------
@@ -145,7 +232,12 @@ class MSP430G2xxBslHost:
         try:
             if(self.verbose_mode == True):
                 print "Opening Serial Port:", self.serial_port
-            ser = serial.Serial(self.serial_port, timeout=8)
+            if(self.stop_bits == 2):
+                stop_bits = serial.STOPBITS_TWO
+            else:
+                stop_bits = serial.STOPBITS_ONE
+            ser = serial.Serial(self.serial_port, baudrate=self.baud_rate,
+                stopbits=stop_bits, rtscts=self.rtscts, timeout=8)
         except:
             if(self.verbose_mode == True):
                 print "Failed to open serial port"
@@ -166,18 +258,17 @@ class MSP430G2xxBslHost:
             data_len = len(range(self.start_addr, 0xFFFE))
             print "Sending binary data - length:", data_len, "(",
             print hex(data_len), ") bytes"
-        chksum = 0
-        for addr in range(self.start_addr, 0xFFFE):
-            byte = full_content[self.start_addr][addr-self.start_addr]
-            ser.write(('' + chr(byte)))
-            time.sleep(SLEEP_1MS * 5) # sleep 5 ms between sending bytes
-            chksum ^= byte
-
-        # send checksum
+        data = full_content[self.start_addr][0:(0xFFFE - self.start_addr)]
+        chksum = xor_checksum(data)
+
+        # send the checksum after the data bytes
         if(self.verbose_mode == True):
             print "Sending checksum byte (", hex(chksum),")"
-        ser.write(('' + chr(chksum)))
-        time.sleep(SLEEP_1MS * 5) # sleep 5 ms between sending bytes
+        data.append(chksum)
+        duration = self.send_paced(ser, data)
+        if(self.verbose_mode == True):
+            print "Sent", len(data), "bytes in %.3f s (%.1f bytes/s)" % \
+                (duration, self.bytes_per_sec)
 
         # wait for reply
         if(self.verbose_mode == True):
@@ -210,6 +301,25 @@ if __name__ == '__main__':
     cmd_line_parser.add_option("-s", "--start", action="store", type="int",
             dest="start_addr", help="flash start address with value of SADDR",
             metavar="SADDR")
+    cmd_line_parser.add_option("-b", "--baud", action="store", type="int",
+            dest="baud_rate", default=DEFAULT_BAUD_RATE,
+            help="serial baud rate BAUD (default: %d)" % DEFAULT_BAUD_RATE,
+            metavar="BAUD")
+    cmd_line_parser.add_option("--stop-bits", action="store", type="choice",
+            choices=["1", "2"], dest="stop_bits", default=str(DEFAULT_STOP_BITS),
+            help="number of stop bits (default: %d)" % DEFAULT_STOP_BITS)
+    cmd_line_parser.add_option("--chunk-time", action="store", type="float",
+            dest="chunk_time", default=DEFAULT_CHUNK_TIME * 1000,
+            help="target write time of one chunk in MS milliseconds " +
+            "(default: %d)" % (DEFAULT_CHUNK_TIME * 1000), metavar="MS")
+    cmd_line_parser.add_option("--byte-gap", action="store", type="float",
+            dest="byte_gap", default=DEFAULT_BYTE_GAP * 1000,
+            help="extra idle time after every byte in MS milliseconds, " +
+            "bytes are sent one by one if not zero (default: %d)" %
+            (DEFAULT_BYTE_GAP * 1000), metavar="MS")
+    cmd_line_parser.add_option("--rtscts", action="store_true",
+            dest="rtscts", default=False,
+            help="use hardware flow control (RTS/CTS)")
     (options, args) = cmd_line_parser.parse_args()
 
     # check given input file name parameter
@@ -229,11 +339,17 @@ if __name__ == '__main__':
     # create new instance of TI-TXT class
     bsl = MSP430G2xxBslHost(options.serial_port, options.file_name,
                 options.start_addr, options.verbose)
+    bsl.set_serial_settings(options.baud_rate, int(options.stop_bits),
+                options.rtscts)
+    bsl.set_pacing(options.chunk_time * SLEEP_1MS,
+                options.byte_gap * SLEEP_1MS)
 
     # flash target device
     result = bsl.flash_target()
     if(result == False):
         print "Fail to flash target device!"
+    else:
+        print "Target device flashed - %.1f bytes/s" % bsl.bytes_per_sec
 
     # exit
     sys.exit(0)
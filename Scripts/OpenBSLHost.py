@@ -33,7 +33,7 @@
 #
 # Author:      Leo Hendrawan
 #
-# Version:     0.3
+# Version:     0.4
 #
 # Licence:     BSD license
 #
@@ -42,15 +42,35 @@
 # Log:
 #     - Version 0.3 (2013.02.22) :
 #       Hello World! (created)
+#     - Version 0.4 (2026.10.18) :
+#       * checksums are calculated with TiTxtChecksum module
+#       * flash_image_segment_wise() verifies the checksums which were
+#         calculated while parsing the image
+#       * download_image() and download_segment() build the whole packet in
+#         one buffer and send it in paced chunks instead of one byte per
+#         write with 10 ms sleep after each data byte (--byte-wise measures
+#         the former timing)
+#       * command frames are built by the encode_*() functions and sent
+#         with a single write
+#       * upload_image() and upload_segment() read the whole frame into a
+#         preallocated bytearray and return TiTxtImage / bytearray
+#       * flash_image_segment_wise() keeps a window of download segment
+#         commands in flight and retransmits failed segments
+#       * flash_image_segment_wise() can skip erased (0xFF) runs of the image,
+#         the image checksum is always verified when erased runs are skipped
 #
 #===============================================================================
 #!/usr/bin/env python
 
 import sys
+import re
 import optparse
 import time
+import struct
+import collections
 import serial
-from TiTxtParser import TiTxtParser
+from TiTxtParser import TiTxtParser, TiTxtImage
+from TiTxtChecksum import open_bsl_checksum, CHKSUM_OPEN_BSL
 
 
 #===============================================================================
@@ -110,10 +130,130 @@ MEM_INFO_END_ADDR_KEY = 'end_addr'
 # maximum data segment length
 MAX_DATA_SEG_LEN = 32
 
+# value of erased flash bytes, and minimum length of erased runs which are
+# skipped while flashing an erased device (shorter runs are cheaper to send
+# than the 8 bytes frame overhead of an additional segment)
+ERASED_BYTE = 0xFF
+MIN_ERASED_RUN_LEN = 16
+
+# default write pacing (tunable with --chunk-size and --chunk-delay): packets
+# are written in chunks of WRITE_CHUNK_SIZE bytes with WRITE_CHUNK_DELAY
+# seconds sleep after each chunk (chunk size 0 = whole packet in a single
+# write). The chunk size is the maximum data length of a segment, the delay
+# is the former delay after each data byte. This pacing has not been measured
+# against the target timing, it is safe because a corrupted packet can't be
+# written silently: the firmware rejects packets with wrong checksum,
+# flash_image_segment_wise() retransmits rejected segments and can verify the
+# image checksum. --byte-wise restores the former timing
+DEFAULT_WRITE_CHUNK_SIZE = MAX_DATA_SEG_LEN
+DEFAULT_WRITE_CHUNK_DELAY = 0.01
+
+# default number of download segment commands in flight (1 = wait for the
+# response of each command before sending the next one)
+DEFAULT_WINDOW_SIZE = 1
+# default number of retransmissions of a failed segment
+DEFAULT_MAX_RETRY = 3
+
+# sleep after each data byte of the former byte-wise transmission, used to
+# estimate the saved time, and for byte-wise writing (--byte-wise) which
+# measures the time of the former transmission (header and checksum bytes
+# were sent without sleep)
+LEGACY_BYTE_DELAY = 0.01
+
 
 # target device password
 passwd= ['M', 'Y', 'P', 'A', 'S', 'S', 'W', 'D']
 
+#===============================================================================
+# OpenBSL packet encoder - builds complete command frames as string, which
+# can be written to the serial port at once (also usable by simulators/tests)
+#===============================================================================
+
+#-------------------------------------------------------------------------------
+# encode 32-bit address - LSB first
+#-------------------------------------------------------------------------------
+def encode_addr(addr):
+    return struct.pack("<I", addr & 0xFFFFFFFF)
+
+#-------------------------------------------------------------------------------
+# encode command frame: command byte, header bytes and the payload followed
+# by its checksum - LSB first (no checksum if payload is None)
+#-------------------------------------------------------------------------------
+def encode_packet(cmd, header = "", payload = None):
+    packet = bytearray([cmd])
+    packet.extend(header)
+    if(payload != None):
+        payload = bytearray(payload)
+        checksum = open_bsl_checksum(payload)
+        packet.extend(payload)
+        packet.append(checksum & 0x00FF)
+        packet.append((checksum & 0xFF00) >> 8)
+    return str(packet)
+
+#-------------------------------------------------------------------------------
+# encode OPEN_BSL_CMD_SYNC command
+#-------------------------------------------------------------------------------
+def encode_sync():
+    return encode_packet(OPEN_BSL_CMD_SYNC)
+
+#-------------------------------------------------------------------------------
+# encode OPEN_BSL_CMD_PASSWD command, password bytes can be chars or integers
+#-------------------------------------------------------------------------------
+def encode_password(password):
+    pwd = bytearray()
+    for pwd_byte in password:
+        if(type(pwd_byte) == str):
+            pwd_byte = ord(pwd_byte)
+        pwd.append(pwd_byte)
+    return encode_packet(OPEN_BSL_CMD_PASSWD, "", pwd)
+
+#-------------------------------------------------------------------------------
+# encode OPEN_BSL_GET_MEM_INFO command
+#-------------------------------------------------------------------------------
+def encode_get_mem_info():
+    return encode_packet(OPEN_BSL_GET_MEM_INFO)
+
+#-------------------------------------------------------------------------------
+# encode OPEN_BSL_CMD_ERASE_IMAGE command
+#-------------------------------------------------------------------------------
+def encode_erase_image(idx):
+    return encode_packet(OPEN_BSL_CMD_ERASE_IMAGE, chr(idx))
+
+#-------------------------------------------------------------------------------
+# encode OPEN_BSL_CMD_DOWNLOAD_IMAGE command
+#-------------------------------------------------------------------------------
+def encode_download_image(idx, data):
+    return encode_packet(OPEN_BSL_CMD_DOWNLOAD_IMAGE, chr(idx), data)
+
+#-------------------------------------------------------------------------------
+# encode OPEN_BSL_CMD_UPLOAD_IMAGE command
+#-------------------------------------------------------------------------------
+def encode_upload_image(idx):
+    return encode_packet(OPEN_BSL_CMD_UPLOAD_IMAGE, chr(idx))
+
+#-------------------------------------------------------------------------------
+# encode OPEN_BSL_CMD_RUN_APP command
+#-------------------------------------------------------------------------------
+def encode_run_app():
+    return encode_packet(OPEN_BSL_CMD_RUN_APP)
+
+#-------------------------------------------------------------------------------
+# encode segment command with start and end address parameter
+# (OPEN_BSL_CMD_CALCULATE_CHECKSUM, OPEN_BSL_CMD_ERASE_SEGMENT and
+# OPEN_BSL_CMD_UPLOAD_SEGMENT)
+#-------------------------------------------------------------------------------
+def encode_addr_range(cmd, start_addr, end_addr):
+    return encode_packet(cmd, "", encode_addr(start_addr) + encode_addr(end_addr))
+
+#-------------------------------------------------------------------------------
+# encode OPEN_BSL_CMD_DOWNLOAD_SEGMENT command
+#-------------------------------------------------------------------------------
+def encode_download_segment(start_addr, data):
+    payload = bytearray(encode_addr(start_addr))
+    payload.extend(data)
+    return encode_packet(OPEN_BSL_CMD_DOWNLOAD_SEGMENT,
+        chr(len(payload) + OPEN_BSL_CHKSUM_LEN), payload)
+
 #===============================================================================
 # OpenBSL Host class
 #===============================================================================
@@ -131,6 +271,18 @@ class OpenBSLHost:
     mem_info = {}
     # parser object
     parser = 0
+    # write pacing
+    write_chunk_size = DEFAULT_WRITE_CHUNK_SIZE
+    write_chunk_delay = DEFAULT_WRITE_CHUNK_DELAY
+    # flag for byte-wise writing with the former timing
+    byte_wise = False
+    # segment flashing window and retransmissions
+    window_size = DEFAULT_WINDOW_SIZE
+    max_retry = DEFAULT_MAX_RETRY
+    # accumulated packet write time, and estimated time of byte-wise writing
+    # (only its sleep time, i.e. a lower bound)
+    write_time = 0
+    legacy_time_estimate = 0
 
     #---------------------------------------------------------------------------
     # Class functions
@@ -161,6 +313,77 @@ class OpenBSLHost:
         self.verbose_mode = verbose
         pass
 
+    #---------------------------------------------------------------------------
+    # setting write pacing (chunk size in bytes, delay after chunk in seconds).
+    # Chunk size 0 or delay 0 sends the whole packet in a single write, which
+    # can be used when the OpenBSL firmware buffers its input
+    #---------------------------------------------------------------------------
+    def set_write_pacing(self, chunk_size, chunk_delay):
+        self.write_chunk_size = chunk_size
+        self.write_chunk_delay = chunk_delay
+        pass
+
+    #---------------------------------------------------------------------------
+    # setting byte-wise writing: every byte is written separately with
+    # LEGACY_BYTE_DELAY sleep after each data byte like former versions, the
+    # write pacing is ignored
+    #---------------------------------------------------------------------------
+    def set_byte_wise(self, byte_wise):
+        self.byte_wise = byte_wise
+        pass
+
+    #---------------------------------------------------------------------------
+    # setting number of download segment commands in flight while flashing
+    # and number of retransmissions of a failed segment
+    #---------------------------------------------------------------------------
+    def set_window(self, window_size, max_retry = DEFAULT_MAX_RETRY):
+        self.window_size = max(1, window_size)
+        self.max_retry = max_retry
+        pass
+
+    #---------------------------------------------------------------------------
+    # reset the accumulated write times
+    #---------------------------------------------------------------------------
+    def reset_write_time(self):
+        self.write_time = 0
+        self.legacy_time_estimate = 0
+        pass
+
+    #---------------------------------------------------------------------------
+    # send complete packet according to the write pacing. num_of_data is the
+    # number of data bytes (in front of the checksum) which were sent with a
+    # 10 ms sleep each before, it is used to estimate the saved time. Returns
+    # measured transmission time
+    #---------------------------------------------------------------------------
+    def send_packet(self, packet, num_of_data = 0):
+        start_time = time.time()
+        if(self.byte_wise == True):
+            # former timing: sleep after the data bytes only
+            data_end = len(packet) - OPEN_BSL_CHKSUM_LEN
+            data_start = data_end - num_of_data
+            for idx in xrange(len(packet)):
+                self.serial_port.write(str(packet[idx:(idx + 1)]))
+                if((idx >= data_start) and (idx < data_end)):
+                    time.sleep(LEGACY_BYTE_DELAY)
+        elif((self.write_chunk_size <= 0) or (self.write_chunk_delay <= 0)):
+            self.serial_port.write(str(packet))
+        else:
+            for idx in xrange(0, len(packet), self.write_chunk_size):
+                self.serial_port.write(str(packet[idx:(idx +
+                    self.write_chunk_size)]))
+                time.sleep(self.write_chunk_delay)
+        duration = time.time() - start_time
+
+        # update the statistics
+        legacy_estimate = num_of_data * LEGACY_BYTE_DELAY
+        self.write_time = self.write_time + duration
+        self.legacy_time_estimate = self.legacy_time_estimate + legacy_estimate
+        if(self.verbose_mode == True):
+            print "Sent", len(packet), "bytes in %.3f s" % duration,
+            print "(byte-wise estimated: > %.3f s)" % legacy_estimate
+
+        return duration
+
     #---------------------------------------------------------------------------
     # print error message
     #---------------------------------------------------------------------------
@@ -208,32 +431,38 @@ class OpenBSLHost:
 
         return True
 
+    #---------------------------------------------------------------------------
+    # read length bytes from the serial port into a preallocated bytearray.
+    # Returns None if not all bytes were received before the timeout
+    #---------------------------------------------------------------------------
+    def read_frame(self, length):
+        frame = bytearray(length)
+        view = memoryview(frame)
+        received = 0
+        while(received < length):
+            num = self.serial_port.readinto(view[received:])
+            if(not num):
+                break
+            received = received + num
+        if(received != length):
+            if(self.verbose_mode == True):
+                print "Timeout - received", received, "of", length, "bytes"
+            return None
+        return frame
+
     #---------------------------------------------------------------------------
     # verify checksum in the given packet
     #---------------------------------------------------------------------------
     def verify_packet_checksum(self, pkt_len, packet):
         #init vars
-        checksum = 0
         chksum_ok = False
-        if((pkt_len > 0) and (len(packet) == pkt_len)):
+        if((pkt_len > 1) and (len(packet) == pkt_len)):
             # calculate checksum
-            for i in range(pkt_len-2):
-                temp = checksum
-                checksum = (temp >> 1)
-                if(temp & 0x01):
-                    checksum |= 0x8000
-                checksum = checksum & 0xFFFF
-                if(type(packet) == str):
-                    checksum += ord(packet[i])
-                else:
-                    checksum += packet[i]
-                checksum = checksum & 0xFFFF
+            checksum = open_bsl_checksum(packet[0:pkt_len-2])
             #print "CHECKSUM: ", hex(checksum)
             # get checksum field
-            if(type(packet) == str):
-                chksum_pkt = (ord(packet[pkt_len-1])*256) + ord(packet[pkt_len-2])
-            else:
-                chksum_pkt = (packet[pkt_len-1]*256) + packet[pkt_len-2]
+            chksum_field = bytearray(packet[pkt_len-2:pkt_len])
+            chksum_pkt = (chksum_field[1]*256) + chksum_field[0]
             # compare
             if(chksum_pkt == checksum):
                 chksum_ok = True
@@ -243,22 +472,15 @@ class OpenBSLHost:
     # verify checksum for given data
     #---------------------------------------------------------------------------
     def verify_checksum(self, data, calculated_chksum):
+        return self.compare_checksum(open_bsl_checksum(data),
+            calculated_chksum)
+
+    #---------------------------------------------------------------------------
+    # compare host checksum with checksum calculated by device
+    #---------------------------------------------------------------------------
+    def compare_checksum(self, checksum, calculated_chksum):
         #init vars
-        checksum = 0
         chksum_ok = False
-        # calculate checksum
-        for i in range(len(data)):
-            temp = checksum
-            checksum = (temp >> 1)
-            if(temp & 0x01):
-                checksum |= 0x8000
-            checksum = checksum & 0xFFFF
-            if(type(data) == str):
-                checksum += ord(data[i])
-            else:
-                checksum += data[i]
-            checksum = checksum & 0xFFFF
-
 
         # compare
         #print "CHECKSUM: ", hex(checksum)
@@ -276,22 +498,9 @@ class OpenBSLHost:
     # update checksum value
     #---------------------------------------------------------------------------
     def update_checksum(self, byte, checksum):
-        temp = checksum
-
-        # shift right
-        checksum = (temp >> 1)
-
-        # remove carry from shift right operation to MSB
-        if(temp & 0x01):
-            checksum |= 0x8000
-        checksum = checksum & 0xFFFF
-        if(type(byte) == str):
-            checksum += ord(byte)
-        else:
-            checksum += byte
-        checksum = checksum & 0xFFFF
-
-        return checksum
+        if(type(byte) != str):
+            byte = chr(byte)
+        return open_bsl_checksum(byte, checksum)
 
     #---------------------------------------------------------------------------
     # send OPEN_BSL_CMD_SYNC command until getting OK response
@@ -316,7 +525,8 @@ class OpenBSLHost:
             self.serial_port.flushOutput()
             self.serial_port.flushInput()
             #send command
-            self.serial_port.write(('' + chr(OPEN_BSL_CMD_SYNC)))
+            self.serial_port.write(encode_sync())
+            retry = retry + 1
             # wait for reply
             byte = self.serial_port.read()
             try:
@@ -354,22 +564,7 @@ class OpenBSLHost:
             # send the request
             if(self.verbose_mode == True):
                 print "Sending OPEN_BSL_CMD_PASSWD byte (", hex(OPEN_BSL_CMD_PASSWD),")"
-            self.serial_port.write(('' + chr(OPEN_BSL_CMD_PASSWD)))
-
-            # send password bytes
-            checksum = 0
-            for pwd_byte in password:
-                # send single byte
-                if(type(pwd_byte) != str):
-                    self.serial_port.write(('' + chr(pwd_byte)))
-                else:
-                    self.serial_port.write(pwd_byte)
-                # update checksum
-                checksum = self.update_checksum(pwd_byte, checksum)
-
-            # send the checksum bytes - LSB first
-            self.serial_port.write(('' + chr( (checksum & 0x00FF) )))
-            self.serial_port.write(('' + chr( (checksum & 0xFF00) >> 8 )))
+            self.serial_port.write(encode_password(password))
 
             # set timeout
             self.serial_port.timeout = 0.5
@@ -407,7 +602,7 @@ class OpenBSLHost:
         # send the request
         if(self.verbose_mode == True):
             print "Sending OPEN_BSL_GET_MEM_INFO byte (", hex(OPEN_BSL_GET_MEM_INFO),")"
-        self.serial_port.write(('' + chr(OPEN_BSL_GET_MEM_INFO)))
+        self.serial_port.write(encode_get_mem_info())
 
         # set timeout
         self.serial_port.timeout = 1
@@ -488,8 +683,7 @@ class OpenBSLHost:
         if(self.verbose_mode == True):
             print "Sending OPEN_BSL_CMD_ERASE_IMAGE byte (", hex(OPEN_BSL_CMD_ERASE_IMAGE),")",
             print "- index:", hex(idx)
-        self.serial_port.write(('' + chr(OPEN_BSL_CMD_ERASE_IMAGE)))
-        self.serial_port.write(('' + chr(idx)))
+        self.serial_port.write(encode_erase_image(idx))
 
         # set timeout
         self.serial_port.timeout = 2
@@ -544,19 +738,7 @@ class OpenBSLHost:
         # send the command
         if(self.verbose_mode == True):
             print "Sending OPEN_BSL_CMD_DOWNLOAD_IMAGE byte (", hex(OPEN_BSL_CMD_DOWNLOAD_IMAGE),")"
-        self.serial_port.write(('' + chr(OPEN_BSL_CMD_DOWNLOAD_IMAGE)))
-        self.serial_port.write(('' + chr(idx)))
-
-        # now we are ready to send data
-        checksum = 0
-        for byte in data:
-            self.serial_port.write(('' + chr(byte)))
-            time.sleep(0.01) # sleep to enable device writing bytes
-            checksum = self.update_checksum(byte, checksum)
-
-        # send the checksum bytes - LSB first
-        self.serial_port.write(('' + chr( (checksum & 0x00FF) )))
-        self.serial_port.write(('' + chr( (checksum & 0xFF00) >> 8 )))
+        self.send_packet(encode_download_image(idx, data), len(data))
 
         # set timeout
         self.serial_port.timeout = 1
@@ -579,7 +761,7 @@ class OpenBSLHost:
     #---------------------------------------------------------------------------
     def upload_image(self, idx = 0xFF):
         # init var
-        image = {}
+        image = TiTxtImage()
 
         # check if serial port has been initialized
         if (self.serial_port == 0):
@@ -597,8 +779,7 @@ class OpenBSLHost:
         if(self.verbose_mode == True):
             print "Sending OPEN_BSL_CMD_UPLOAD_IMAGE byte (", hex(OPEN_BSL_CMD_UPLOAD_IMAGE),")",
             print "- index:", hex(idx)
-        self.serial_port.write(('' + chr(OPEN_BSL_CMD_UPLOAD_IMAGE)))
-        self.serial_port.write(('' + chr(idx)))
+        self.serial_port.write(encode_upload_image(idx))
 
         # set timeout
         self.serial_port.timeout = 0.5
@@ -621,13 +802,11 @@ class OpenBSLHost:
                     len_mem = end_addr - start_addr + 1
                     if(self.verbose_mode == True):
                         print "Receiving image index:", ord(mem_num), "- Start Addr:", hex(start_addr), ", len:", hex(len_mem)
-                    image[start_addr] = []
-                    for j in range(len_mem+2):
-                        # read the incoming bytes header resp
-                        byte = self.serial_port.read()
-                        image[start_addr].append(ord(byte))
+                    # read the image data and checksum at once
+                    frame = self.read_frame(len_mem + OPEN_BSL_CHKSUM_LEN)
                     # verify checksum
-                    if(self.verify_packet_checksum(len_mem+2, image[start_addr]) != True):
+                    if((frame == None) or (self.verify_packet_checksum(
+                            len_mem + OPEN_BSL_CHKSUM_LEN, frame) != True)):
                         if(self.verbose_mode == True):
                 	       print "Wrong checksum!"
                         return {}
@@ -635,9 +814,12 @@ class OpenBSLHost:
                         if(self.verbose_mode == True):
                             print "Received positive response (", hex(ord(resp_byte)),")",
                             print "- for image index:", ord(mem_num)
-                        # remove checksum
-                        image[start_addr].pop()
-                        image[start_addr].pop()
+                        # remove checksum, keep it as memoized checksum
+                        checksum = frame[len_mem] + (frame[len_mem + 1] * 256)
+                        del frame[len_mem:]
+                        image[start_addr] = frame
+                        image.set_segment_checksum(start_addr,
+                            CHKSUM_OPEN_BSL, checksum)
                 else:
                     if(self.verbose_mode == True):
                         self.print_error(resp_byte)
@@ -667,39 +849,8 @@ class OpenBSLHost:
         if(self.verbose_mode == True):
             print "Sending OPEN_BSL_CMD_CALCULATE_CHECKSUM byte (", hex(OPEN_BSL_CMD_CALCULATE_CHECKSUM),")",
             print "- StartAddr:", hex(start_addr), ", EndAddr:", hex(end_addr)
-        self.serial_port.write(('' + chr(OPEN_BSL_CMD_CALCULATE_CHECKSUM)))
-
-        # send start address
-        byte = start_addr & 0xFF # byte 0
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (start_addr & 0xFF00) >> 8 # byte 1
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (start_addr & 0xFF0000) >> 16 # byte 2
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (start_addr & 0xFF000000) >> 24 # byte 3
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-
-        # send end address
-        byte = end_addr & 0xFF # byte 0
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (end_addr & 0xFF00) >> 8 # byte 1
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (end_addr & 0xFF0000) >> 16 # byte 2
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (end_addr & 0xFF000000) >> 24 # byte 3
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-
-        # send the checksum bytes - LSB first
-        self.serial_port.write(('' + chr( (chksum & 0x00FF) )))
-        self.serial_port.write(('' + chr( (chksum & 0xFF00) >> 8 )))
+        self.serial_port.write(encode_addr_range(OPEN_BSL_CMD_CALCULATE_CHECKSUM,
+            start_addr, end_addr))
 
         # set timeout
         self.serial_port.timeout = 2
@@ -733,7 +884,6 @@ class OpenBSLHost:
     def erase_segment(self, start_addr, end_addr):
         # init variable
         ret_val = True
-        chksum = 0
 
         # check if serial port has been initialized
         if (self.serial_port == 0):
@@ -745,39 +895,8 @@ class OpenBSLHost:
         if(self.verbose_mode == True):
             print "Sending OPEN_BSL_CMD_ERASE_SEGMENT byte (", hex(OPEN_BSL_CMD_ERASE_SEGMENT),")",
             print "- StartAddr:", hex(start_addr), ", EndAddr:", hex(end_addr)
-        self.serial_port.write(('' + chr(OPEN_BSL_CMD_ERASE_SEGMENT)))
-
-        # send start address
-        byte = start_addr & 0xFF # byte 0
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (start_addr & 0xFF00) >> 8 # byte 1
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (start_addr & 0xFF0000) >> 16 # byte 2
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (start_addr & 0xFF000000) >> 24 # byte 3
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-
-        # send end address
-        byte = end_addr & 0xFF # byte 0
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (end_addr & 0xFF00) >> 8 # byte 1
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (end_addr & 0xFF0000) >> 16 # byte 2
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (end_addr & 0xFF000000) >> 24 # byte 3
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-
-        # send the checksum bytes - LSB first
-        self.serial_port.write(('' + chr( (chksum & 0x00FF) )))
-        self.serial_port.write(('' + chr( (chksum & 0xFF00) >> 8 )))
+        self.serial_port.write(encode_addr_range(OPEN_BSL_CMD_ERASE_SEGMENT,
+            start_addr, end_addr))
 
         # set timeout
         self.serial_port.timeout = 2
@@ -806,8 +925,7 @@ class OpenBSLHost:
     #---------------------------------------------------------------------------
     def upload_segment(self, start_addr, end_addr):
         # init var
-        data = []
-        chksum = 0
+        data = bytearray()
 
         # check if serial port has been initialized
         if (self.serial_port == 0):
@@ -818,39 +936,8 @@ class OpenBSLHost:
         # send the request
         if(self.verbose_mode == True):
             print "Sending OPEN_BSL_CMD_UPLOAD_SEGMENT byte (", hex(OPEN_BSL_CMD_UPLOAD_SEGMENT),")"
-        self.serial_port.write(('' + chr(OPEN_BSL_CMD_UPLOAD_SEGMENT)))
-
-        # send start address
-        byte = start_addr & 0xFF # byte 0
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (start_addr & 0xFF00) >> 8 # byte 1
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (start_addr & 0xFF0000) >> 16 # byte 2
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (start_addr & 0xFF000000) >> 24 # byte 3
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-
-        # send end address
-        byte = end_addr & 0xFF # byte 0
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (end_addr & 0xFF00) >> 8 # byte 1
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (end_addr & 0xFF0000) >> 16 # byte 2
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (end_addr & 0xFF000000) >> 24 # byte 3
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-
-        # send the checksum bytes - LSB first
-        self.serial_port.write(('' + chr( (chksum & 0x00FF) )))
-        self.serial_port.write(('' + chr( (chksum & 0xFF00) >> 8 )))
+        self.serial_port.write(encode_addr_range(OPEN_BSL_CMD_UPLOAD_SEGMENT,
+            start_addr, end_addr))
 
         # set timeout
         self.serial_port.timeout = 0.5
@@ -864,22 +951,21 @@ class OpenBSLHost:
                 len_pckt = self.serial_port.read()
                 upload_len = end_addr - start_addr + 1
                 if (ord(len_pckt) == upload_len + OPEN_BSL_CHKSUM_LEN):
-                    chksum = 0
-                    # collect the data bytes
-                    for i in range(upload_len):
-                        byte = ord(self.serial_port.read())
-                        data.append(byte)
-                        chksum = self.update_checksum(byte, chksum)
-                    # remove checksum
-                    rcv_chksum = ord(self.serial_port.read())
-                    rcv_chksum += ord(self.serial_port.read()) * 256
+                    # read the data bytes and checksum at once
+                    frame = self.read_frame(upload_len + OPEN_BSL_CHKSUM_LEN)
+                    if(frame == None):
+                        return bytearray()
+                    # verify and remove checksum
+                    chksum = open_bsl_checksum(buffer(frame, 0, upload_len))
+                    rcv_chksum = frame[upload_len] + (frame[upload_len + 1] * 256)
                     if(rcv_chksum != chksum):
                         if(self.verbose_mode == True):
                 	       print "Wrong checksum:", hex(rcv_chksum), "- expected: ", hex(chksum)
-                        data = []
                     else:
                         if(self.verbose_mode == True):
                             print "Received positive response (", hex(ord(resp_byte)),")"
+                        del frame[upload_len:]
+                        data = frame
                 else:
                     if(self.verbose_mode == True):
             	       print "Unexpected packet length:", len_pckt, "- expected: ", (upload_len+OPEN_BSL_CHKSUM_LEN)
@@ -891,7 +977,7 @@ class OpenBSLHost:
         except:
             if(self.verbose_mode == True):
             	print "Exception while sending OPEN_BSL_CMD_UPLOAD_SEGMENT"
-            data = []
+            data = bytearray()
 
         return data
 
@@ -901,7 +987,6 @@ class OpenBSLHost:
     def download_segment(self, start_addr, data):
         # init var
         ret_val = False
-        chksum = 0
 
         # check if serial port has been initialized
         if (self.serial_port == 0):
@@ -920,35 +1005,7 @@ class OpenBSLHost:
         if(self.verbose_mode == True):
             print "Sending OPEN_BSL_CMD_DOWNLOAD_SEGMENT byte (", hex(OPEN_BSL_CMD_DOWNLOAD_SEGMENT),")",
             print "- data length:", len(data)
-        self.serial_port.write(('' + chr(OPEN_BSL_CMD_DOWNLOAD_SEGMENT)))
-
-        # send packet length
-        pckt_len = len(data) + OPEN_BSL_CHKSUM_LEN + 4
-        self.serial_port.write(('' + chr(pckt_len)))
-
-        # send start address
-        byte = start_addr & 0xFF # byte 0
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (start_addr & 0xFF00) >> 8 # byte 1
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (start_addr & 0xFF0000) >> 16 # byte 2
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-        byte = (start_addr & 0xFF000000) >> 24 # byte 3
-        self.serial_port.write(('' + chr(byte)))
-        chksum = self.update_checksum(byte, chksum)
-
-        # send the data bytes
-        for byte in data:
-            self.serial_port.write(('' + chr(byte)))
-            time.sleep(0.01) # sleep to enable device writing bytes
-            chksum = self.update_checksum(byte, chksum)
-
-        # send the checksum bytes - LSB first
-        self.serial_port.write(('' + chr( (chksum & 0x00FF) )))
-        self.serial_port.write(('' + chr( (chksum & 0xFF00) >> 8 )))
+        self.send_packet(encode_download_segment(start_addr, data), len(data))
 
         # set timeout
         self.serial_port.timeout = 0.5
@@ -972,6 +1029,72 @@ class OpenBSLHost:
         return ret_val
 
 
+    #---------------------------------------------------------------------------
+    # download list of (start address, data) segments. Up to window_size
+    # download segment commands are sent before waiting for a response. The
+    # device responds in order, so each response belongs to the oldest
+    # segment in flight (responses don't carry the address, frames which are
+    # lost without any response are only found by the checksum verification).
+    # On negative response or timeout the device is synchronized again and
+    # the failed segment and all segments in flight after it are retransmitted
+    #---------------------------------------------------------------------------
+    def download_segments(self, segments):
+        # check if serial port has been initialized
+        if (self.serial_port == 0):
+            if(self.verbose_mode == True):
+            	print "Serial Port hasn't been initialized"
+            return False
+
+        # init var
+        queue = collections.deque(segments)
+        in_flight = collections.deque()
+        retries = {}
+        pos_resp = chr(OPEN_BSL_CMD_DOWNLOAD_SEGMENT | OPEN_BSL_RESP_BIT_MASK)
+
+        # set timeout
+        self.serial_port.timeout = 0.5
+
+        while((len(queue) > 0) or (len(in_flight) > 0)):
+            # fill the window
+            while((len(queue) > 0) and (len(in_flight) < self.window_size)):
+                (start_addr, data) = queue.popleft()
+                if(self.verbose_mode == True):
+                    print "Sending OPEN_BSL_CMD_DOWNLOAD_SEGMENT byte (", hex(OPEN_BSL_CMD_DOWNLOAD_SEGMENT),")",
+                    print "- addr:", hex(start_addr), ", data length:", len(data)
+                self.send_packet(encode_download_segment(start_addr, data),
+                    len(data))
+                in_flight.append((start_addr, data))
+
+            # match the response with the oldest segment in flight
+            segment = in_flight.popleft()
+            resp_byte = self.serial_port.read()
+            if(resp_byte == pos_resp):
+                continue
+            if(self.verbose_mode == True):
+                if(len(resp_byte) == 0):
+                    print "Timeout waiting for response of segment:", hex(segment[0])
+                else:
+                    self.print_error(resp_byte)
+
+            # the device may have lost the frame boundaries, so the frames in
+            # flight can't be trusted: synchronize again (which also drains
+            # the serial port) and retransmit all of them
+            retries[segment[0]] = retries.get(segment[0], 0) + 1
+            if(retries[segment[0]] > self.max_retry):
+                if(self.verbose_mode == True):
+                    print "Failed to download segment at addr:", hex(segment[0])
+                return False
+            failed = [segment] + list(in_flight)
+            in_flight.clear()
+            if(self.synchronize() != True):
+                return False
+            self.serial_port.timeout = 0.5
+
+            # put failed segments back to the front of the queue
+            queue.extendleft(reversed(failed))
+
+        return True
+
     #---------------------------------------------------------------------------
     # run application by sending OPEN_BSL_CMD_RUN_APP command
     #---------------------------------------------------------------------------
@@ -989,7 +1112,7 @@ class OpenBSLHost:
         if(self.verbose_mode == True):
             print "Sending OPEN_BSL_CMD_RUN_APP byte (", hex(OPEN_BSL_CMD_RUN_APP),")",
             print "- index:", hex(idx)
-        self.serial_port.write(('' + chr(OPEN_BSL_CMD_RUN_APP)))
+        self.serial_port.write(encode_run_app())
 
         # set timeout
         self.serial_port.timeout = 0.1
@@ -1013,9 +1136,50 @@ class OpenBSLHost:
 
 
     #---------------------------------------------------------------------------
-    # flash_image_segment_wise
+    # get (start, stop) offsets of the section data which has to be written
+    # into erased flash, i.e. without the runs of erased bytes of at least
+    # MIN_ERASED_RUN_LEN bytes
+    #---------------------------------------------------------------------------
+    def get_payload_runs(self, section):
+        if(type(section) != bytearray):
+            section = section[:]
+        erased_run = re.compile(re.escape(chr(ERASED_BYTE)) + "{%d,}" %
+            MIN_ERASED_RUN_LEN)
+        runs = []
+        start = 0
+        for match in erased_run.finditer(section):
+            if(match.start() > start):
+                runs.append((start, match.start()))
+            start = match.end()
+        if(start < len(section)):
+            runs.append((start, len(section)))
+        return runs
+
+    #---------------------------------------------------------------------------
+    # split the image sections into (start address, data) segments of up to
+    # MAX_DATA_SEG_LEN bytes, skip the erased runs if skip_erased is True
+    #---------------------------------------------------------------------------
+    def get_download_segments(self, image, skip_erased = False):
+        segments = []
+        for addr in image.sorted_addrs():
+            section = image[addr]
+            if(skip_erased == True):
+                runs = self.get_payload_runs(section)
+            else:
+                runs = [(0, len(section))]
+            for (start, stop) in runs:
+                for i in xrange(start, stop, MAX_DATA_SEG_LEN):
+                    segments.append((addr + i,
+                        section[i:min(i + MAX_DATA_SEG_LEN, stop)]))
+        return segments
+
     #---------------------------------------------------------------------------
-    def flash_image_segment_wise(self, file_name, check_img_checksum = False):
+    # flash_image_segment_wise - skip_erased shall only be set if the target
+    # memory has been erased before (e.g. with erase_image()), it enables the
+    # image checksum check
+    #---------------------------------------------------------------------------
+    def flash_image_segment_wise(self, file_name, check_img_checksum = False,
+            skip_erased = False):
         # init var
         ret_val = False
 
@@ -1025,40 +1189,41 @@ class OpenBSLHost:
             	print "Serial Port hasn't been initialized"
             return data
 
-        # parse the image
+        # skipped runs are only known to be erased if the checksum verification
+        # passes, so the verification is forced when skipping erased runs
+        if((skip_erased == True) and (check_img_checksum == False)):
+            if(self.verbose_mode == True):
+                print "Skipping erased runs, image checksum check enabled"
+            check_img_checksum = True
+
+        # parse the image, calculate the section checksums while parsing
+        if(check_img_checksum != False):
+            self.parser.set_checksum_algorithms([CHKSUM_OPEN_BSL])
+        else:
+            self.parser.set_checksum_algorithms([])
         image = self.parser.parse(file_name)
         if(image == {}):
             if(self.verbose_mode == True):
             	print "Failed to parser input file:", file_name
             return ret_val
 
-        # get the starting address of the image
-        start_addrs = image.keys()
-        for addr in start_addrs:
-            i = 0
-            curr_addr = addr
-            # get section length
-            sect_len = len (image[addr])
-            while (i < sect_len):
-                # get data to be downloaded
-                data_len_left = sect_len - i
-                data_len = min(data_len_left, MAX_DATA_SEG_LEN)
-                data = []
-                for idx in range(i, (i+data_len)):
-                    data.append(image[addr][idx])
-                # download segment
-                if(self.download_segment(curr_addr, data) != True):
-                    if(self.verbose_mode == True):
-                    	print "Failed to download segment starting from addr:", hex(addr)
-                    return ret_val
-                # update index and address parameter
-                i = i + data_len
-                curr_addr = curr_addr + data_len
+        # download the image segments
+        self.reset_write_time()
+        segments = self.get_download_segments(image, skip_erased)
+        if(self.verbose_mode == True):
+            image_len = sum([len(image[addr]) for addr in image.keys()])
+            data_len = sum([len(data) for (addr, data) in segments])
+            print "Downloading", data_len, "of", image_len, "image bytes in",
+            print len(segments), "segments"
+        if(self.download_segments(segments) != True):
+            if(self.verbose_mode == True):
+            	print "Failed to download image"
+            return ret_val
 
         # check image checksum if necessary
         if(check_img_checksum != False):
             # get the starting address of the image
-            start_addrs = image.keys()
+            start_addrs = image.sorted_addrs()
             for addr in start_addrs:
                 # get section length
                 len_section = len(image[addr])
@@ -1068,10 +1233,11 @@ class OpenBSLHost:
                 # ask device to calculate checksum for particular section
                 dev_chksum = self.calculate_checksum(addr, end_addr)
                 # verify the checksum
-                if(self.verify_checksum(image[addr], dev_chksum) != True):
+                if(self.compare_checksum(image.get_segment_checksum(addr,
+                        CHKSUM_OPEN_BSL), dev_chksum) != True):
                     if(self.verbose_mode == True):
                     	print "Unmatched checksum at section:", hex(addr),"-", hex(end_addr)
-                        return ret_val
+                    return ret_val
 
         # all data has been successfully downloaded
         ret_val = True
@@ -1137,9 +1303,9 @@ def test_msp430g2553(port_name, verbose_mode):
             sys.exit(1)
 
     # write new image at mem section 0
-    new_image = []
+    new_image = bytearray()
     for i in range(len(image[image.keys()[0]])):
-        new_image.append(i)
+        new_image.append(i & 0xFF)
     print "\r\n* Downloading BSL device memory image 0"
     if(openbsl.download_image(0, new_image) != True):
         print "ERROR: Failed to download image!"
@@ -1208,7 +1374,7 @@ def test_msp430g2553(port_name, verbose_mode):
     # send erase segment command
     print "\r\n* Upload Segment"
     data_segment = openbsl.upload_segment(start_addr, end_addr)
-    if(data_segment == []):
+    if(len(data_segment) == 0):
         print "ERROR: Failed to upload segment!"
         sys.exit(1)
     pass
@@ -1272,6 +1438,24 @@ if __name__ == '__main__':
     cmd_line_parser.add_option("-o", "--outfile", action="store", type="string",
             dest="output_file_name", help="output file name in TI TXT format for reading target device",
             metavar="OUTFILE")
+    cmd_line_parser.add_option("--chunk-size", action="store", type="int",
+            dest="chunk_size", default=DEFAULT_WRITE_CHUNK_SIZE,
+            help="write packets in chunks of SIZE bytes, 0 = single write (default: %d)" % DEFAULT_WRITE_CHUNK_SIZE,
+            metavar="SIZE")
+    cmd_line_parser.add_option("--chunk-delay", action="store", type="float",
+            dest="chunk_delay", default=DEFAULT_WRITE_CHUNK_DELAY * 1000,
+            help="delay after each written chunk in ms, 0 = no pacing (default: %g)" % (DEFAULT_WRITE_CHUNK_DELAY * 1000),
+            metavar="MS")
+    cmd_line_parser.add_option("--byte-wise", action="store_true",
+            dest="byte_wise", help="write packets byte-wise with %g ms delay like former versions, e.g. to measure the saved time" % (LEGACY_BYTE_DELAY * 1000))
+    cmd_line_parser.add_option("-w", "--window", action="store", type="int",
+            dest="window_size", default=DEFAULT_WINDOW_SIZE,
+            help="number of segment commands in flight while flashing (default: %d)" % DEFAULT_WINDOW_SIZE,
+            metavar="NUM")
+    cmd_line_parser.add_option("-r", "--retry", action="store", type="int",
+            dest="max_retry", default=DEFAULT_MAX_RETRY,
+            help="number of retransmissions of a failed segment (default: %d)" % DEFAULT_MAX_RETRY,
+            metavar="NUM")
     (options, args) = cmd_line_parser.parse_args()
 
     # check mandatory parameter(s)
@@ -1289,6 +1473,10 @@ if __name__ == '__main__':
         # create new instance of OpenBSL Host
         print "\r\n* Creating new instance of OpenBSL Host"
         openbsl = OpenBSLHost(options.serial_port_name, options.verbose)
+        openbsl.set_write_pacing(options.chunk_size,
+            options.chunk_delay / 1000.0)
+        openbsl.set_byte_wise(options.byte_wise == True)
+        openbsl.set_window(options.window_size, options.max_retry)
 
         # open BSL host
         print "\r\n* Opening Serial Port"
@@ -1316,9 +1504,12 @@ if __name__ == '__main__':
 
         # flash image
         print "\r\n* Flashing image from input file:", options.input_file_name
-        if(openbsl.flash_image_segment_wise(options.input_file_name, True) != True):
+        if(openbsl.flash_image_segment_wise(options.input_file_name, True,
+                True) != True):
             print "ERROR: Failed to flash image into target device!"
             sys.exit(1)
+        print "Image data sent in %.3f s (byte-wise estimated: > %.3f s)" % \
+            (openbsl.write_time, openbsl.legacy_time_estimate)
 
         # try to read the checksum of the flashed image
 
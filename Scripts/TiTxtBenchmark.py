@@ -0,0 +1,258 @@
+#===============================================================================
+# Copyright (c) 2013, Leo Hendrawan
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Leo Hendrawan nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY LEO HENDRAWAN ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#===============================================================================
+
+#===============================================================================
+# Name:        TiTxtBenchmark.py
+#
+# Description: Simple benchmark for measuring the throughput of TiTxtParser
+#
+# Author:      Leo Hendrawan
+#
+# Version:     0.4
+#
+# Licence:     BSD license
+#
+# Note:        The benchmark generates a random TI-TXT image with the given
+#              size in a temporary directory
+#
+# Log:
+#     - Version 0.4 (2026.10.18) :
+#       Hello World! (created)
+#       * adding checksum benchmark (per byte loops vs TiTxtChecksum)
+#       * adding image variant benchmark (copy vs overlay image)
+#
+#===============================================================================
+#!/usr/bin/env python
+
+import sys
+import os
+import optparse
+import shutil
+import tempfile
+import time
+from TiTxtParser import TiTxtParser, TiTxtImage, TiTxtOverlayImage
+from TiTxtCache import TiTxtCache
+import TiTxtChecksum
+
+#===============================================================================
+# Constants
+#===============================================================================
+# start address of the generated image
+BENCH_START_ADDR = 0x4400
+
+# size of each generated segment
+BENCH_SEGMENT_LEN = 0x1000
+
+
+#---------------------------------------------------------------------------
+# generate random image with the given size (in bytes)
+#---------------------------------------------------------------------------
+def gen_image(size):
+    image = TiTxtImage()
+    addr = BENCH_START_ADDR
+    while(size > 0):
+        seg_len = min(size, BENCH_SEGMENT_LEN)
+        image[addr] = bytearray(os.urandom(seg_len))
+        # leave a gap between segments
+        addr += seg_len + 0x10
+        size -= seg_len
+    return image
+
+#---------------------------------------------------------------------------
+# per byte MSP-GANG checksum loop (as used before TiTxtChecksum)
+#---------------------------------------------------------------------------
+def loop_msp_gang_checksum(data):
+    cs = 0
+    i = 0
+    for byte in data:
+        if (i == 0):
+            cs = cs + byte
+            i = 1
+        else:
+            cs = cs + (byte * 256)
+            i = 0
+    if(i == 1):
+        cs = cs + (0xFF * 256)
+    return cs
+
+#---------------------------------------------------------------------------
+# per byte BSL XOR checksum loop (as used before TiTxtChecksum)
+#---------------------------------------------------------------------------
+def loop_xor_checksum(data):
+    chksum = 0
+    for byte in data:
+        chksum ^= byte
+    return chksum
+
+#---------------------------------------------------------------------------
+# per byte OpenBSL checksum loop (as used before TiTxtChecksum)
+#---------------------------------------------------------------------------
+def loop_open_bsl_checksum(data):
+    checksum = 0
+    for i in range(len(data)):
+        temp = checksum
+        checksum = (temp >> 1)
+        if(temp & 0x01):
+            checksum |= 0x8000
+        checksum = checksum & 0xFFFF
+        if(type(data) == str):
+            checksum += ord(data[i])
+        else:
+            checksum += data[i]
+        checksum = checksum & 0xFFFF
+    return checksum
+
+#---------------------------------------------------------------------------
+# calculate MSP-GANG checksum with TiTxtChecksum
+#---------------------------------------------------------------------------
+def msp_gang_checksum(data):
+    cs = TiTxtChecksum.MspGangChecksum()
+    cs.update(data)
+    return cs.get_checksum()
+
+#---------------------------------------------------------------------------
+# measure the average run time of func
+#---------------------------------------------------------------------------
+def measure(func, loops):
+    start = time.time()
+    for i in range(loops):
+        func()
+    return (time.time() - start) / loops
+
+#---------------------------------------------------------------------------
+# print throughput result
+#---------------------------------------------------------------------------
+def print_result(name, num_bytes, duration):
+    mb = float(num_bytes) / (1024 * 1024)
+    print "%-24s: %8.3f ms - %8.2f MB/s" % (name, duration * 1000,
+        mb / duration)
+
+#---------------------------------------------------------------------------
+# run the benchmark
+#---------------------------------------------------------------------------
+def TiTxtBenchmark(size, loops, verbose):
+    ti_txt = TiTxtParser(False)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        # generate the input file
+        image = gen_image(size)
+        file_name = os.path.join(tmp_dir, "bench.txt")
+        ti_txt.print_ti_txt(file_name, image)
+        file_size = os.path.getsize(file_name)
+        if(verbose == True):
+            print "Image size:", image.get_size(), "bytes - TI-TXT file size:",
+            print file_size, "bytes"
+
+        # parse
+        duration = measure(lambda: ti_txt.parse(file_name), loops)
+        print_result("parse", file_size, duration)
+
+        # parse with memory mapping
+        duration = measure(lambda: ti_txt.parse_mmap(file_name, False), loops)
+        print_result("parse_mmap", file_size, duration)
+
+        # parse in parallel, result must be the same as of serial parsing
+        if(ti_txt.parse_parallel(file_name) != ti_txt.parse(file_name)):
+            print "parse_parallel result differs from parse!"
+            return False
+        duration = measure(lambda: ti_txt.parse_parallel(file_name), loops)
+        ti_txt.close_pool()
+        print_result("parse_parallel", file_size, duration)
+
+        # parse with warm parse cache
+        cache = TiTxtCache(os.path.join(tmp_dir, "cache"))
+        cached_parser = TiTxtParser(False, cache)
+        cached_parser.parse(file_name)
+        duration = measure(lambda: cached_parser.parse(file_name), loops)
+        print_result("parse (cached)", file_size, duration)
+
+        # write parsed image
+        out_file_name = os.path.join(tmp_dir, "out.txt")
+        duration = measure(lambda: ti_txt.print_ti_txt(out_file_name, image),
+            loops)
+        print_result("print_ti_txt", file_size, duration)
+
+        # write filled image
+        full_image = ti_txt.fill(image, image.get_start_addr(),
+            image.get_end_addr(), 0xFF)
+        duration = measure(lambda: ti_txt.print_ti_txt(out_file_name,
+            full_image), loops)
+        print_result("print_ti_txt (filled)",
+            os.path.getsize(out_file_name), duration)
+
+        # patched variant of the image: full copy vs overlay image
+        id_bytes = bytearray(6)
+        duration = measure(lambda: image.copy().patch(BENCH_START_ADDR,
+            id_bytes), loops)
+        print_result("variant (copy)", image.get_size(), duration)
+        duration = measure(lambda: TiTxtOverlayImage(image).patch(
+            BENCH_START_ADDR, id_bytes), loops)
+        print_result("variant (overlay)", image.get_size(), duration)
+
+        # checksums: per byte loops vs TiTxtChecksum, results must be equal
+        data = bytearray(os.urandom(size))
+        for (name, loop_func, func) in [
+                ("MSP-GANG", loop_msp_gang_checksum, msp_gang_checksum),
+                ("BSL XOR", loop_xor_checksum, TiTxtChecksum.xor_checksum),
+                ("OpenBSL", loop_open_bsl_checksum,
+                    TiTxtChecksum.open_bsl_checksum)]:
+            if(loop_func(data) != func(data)):
+                print name, "checksum differs from per byte loop!"
+                return False
+            duration = measure(lambda: loop_func(data), loops)
+            print_result(name + " (loop)", size, duration)
+            duration = measure(lambda: func(data), loops)
+            print_result(name, size, duration)
+        duration = measure(lambda: TiTxtChecksum.crc16(data), loops)
+        print_result("CRC16", size, duration)
+        duration = measure(lambda: TiTxtChecksum.crc32(data), loops)
+        print_result("CRC32", size, duration)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    return True
+
+
+if __name__ == '__main__':
+    #parse the command line parameters using OptionParser
+    cmd_line_parser = optparse.OptionParser()
+    cmd_line_parser.add_option("-s", "--size", action="store", type="int",
+            dest="size", default=512*1024,
+            help="size of the generated image in bytes SIZE", metavar="SIZE")
+    cmd_line_parser.add_option("-l", "--loops", action="store", type="int",
+            dest="loops", default=5, help="number of measurement loops LOOPS",
+            metavar="LOOPS")
+    cmd_line_parser.add_option("-v", "--verbose", action="store_true",
+            dest="verbose", help="activate verbose mode")
+    (options, args) = cmd_line_parser.parse_args()
+
+    # run benchmark
+    TiTxtBenchmark(options.size, options.loops, options.verbose)
+
+    # exit
+    sys.exit(0)
@@ -0,0 +1,297 @@
+#===============================================================================
+# Copyright (c) 2013, Leo Hendrawan
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Leo Hendrawan nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY LEO HENDRAWAN ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#===============================================================================
+
+#===============================================================================
+# Name:        TiTxtCache.py
+#
+# Description: Persistent on-disk cache for parsed TI-TXT files
+#
+# Author:      Leo Hendrawan
+#
+# Version:     0.4
+#
+# Licence:     New BSD license
+#
+# Note:        Each cache entry is named after the SHA-1 of the absolute path
+#              of the TI-TXT file and stores the file size, modification time
+#              and SHA-1 of the file content, followed by the raw segments.
+#              The content is only hashed again if the modification time has
+#              changed. Least recently used entries are removed when the total
+#              size of the cache directory exceeds the given limit.
+#
+# Log:
+#     - Version 0.4 (2026.10.18) :
+#       * created, parse cache for TiTxtParser.parse()
+#
+#===============================================================================
+#!/usr/bin/env python
+
+import os
+import struct
+import hashlib
+import tempfile
+
+#===============================================================================
+# Constants
+#===============================================================================
+# environment variable for the default cache directory
+CACHE_DIR_ENV = "TI_TXT_CACHE_DIR"
+
+# default maximum size of the cache directory (bytes)
+CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+# cache entry file format
+CACHE_MAGIC = "TITXTC01"
+CACHE_HEADER = struct.Struct("<8sQd20sI")
+CACHE_SEGMENT_HEADER = struct.Struct("<QI")
+CACHE_EXT = ".bin"
+
+# block size for calculating the content hash
+HASH_BLOCK_SIZE = 1024 * 1024
+
+#===============================================================================
+# TI-TXT cache class
+#===============================================================================
+class TiTxtCache:
+    #---------------------------------------------------------------------------
+    # Class variables
+    #---------------------------------------------------------------------------
+    # cache directory
+    cache_dir = ""
+    # maximum size of all entries in the cache directory
+    max_size = CACHE_MAX_SIZE
+    # flag for verbose mode
+    verbose_mode = False
+
+    #---------------------------------------------------------------------------
+    # init function - instantiation operation
+    #---------------------------------------------------------------------------
+    def __init__(self, cache_dir, max_size=CACHE_MAX_SIZE, verbose=False):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.verbose_mode = verbose
+
+    #---------------------------------------------------------------------------
+    # setting verbose mode
+    #---------------------------------------------------------------------------
+    def set_verbose_mode(self, verbose):
+        self.verbose_mode = verbose
+
+    #---------------------------------------------------------------------------
+    # get the cache entry file name for the given TI-TXT file
+    #---------------------------------------------------------------------------
+    def get_entry_name(self, file_name):
+        path_hash = hashlib.sha1(os.path.abspath(file_name)).hexdigest()
+        return os.path.join(self.cache_dir, path_hash + CACHE_EXT)
+
+    #---------------------------------------------------------------------------
+    # calculate SHA-1 of the file content
+    #---------------------------------------------------------------------------
+    def get_content_hash(self, file_name):
+        sha1 = hashlib.sha1()
+        file = open(file_name, 'rb')
+        try:
+            block = file.read(HASH_BLOCK_SIZE)
+            while(block != ""):
+                sha1.update(block)
+                block = file.read(HASH_BLOCK_SIZE)
+        finally:
+            file.close()
+        return sha1.digest()
+
+    #---------------------------------------------------------------------------
+    # load parsed content of the TI-TXT file from the cache, returns None if
+    # there is no valid cache entry. The content is created with image_class
+    # (e.g. TiTxtParser.TiTxtImage), the cache module doesn't import the
+    # parser, so the parser's own class is used even if it runs as script.
+    # The entry is valid if the file size and modification time are unchanged,
+    # the content hash is only compared if the modification time has changed
+    #---------------------------------------------------------------------------
+    def load(self, file_name, image_class=dict):
+        entry_name = self.get_entry_name(file_name)
+        try:
+            stat = os.stat(file_name)
+            entry = open(entry_name, 'rb')
+        except (IOError, OSError):
+            return None
+
+        try:
+            # check the header: size and modification time, content hash only
+            # if the file has been touched
+            header = entry.read(CACHE_HEADER.size)
+            if(len(header) != CACHE_HEADER.size):
+                return None
+            (magic, size, mtime, content_hash, num_of_segments) = \
+                CACHE_HEADER.unpack(header)
+            if((magic != CACHE_MAGIC) or (size != stat.st_size)):
+                if(self.verbose_mode == True):
+                    print "Stale cache entry for", file_name
+                return None
+            touched = (mtime != stat.st_mtime)
+            if((touched == True) and
+                    (content_hash != self.get_content_hash(file_name))):
+                if(self.verbose_mode == True):
+                    print "Unmatched content hash of cache entry for", file_name
+                return None
+
+            # read the segments
+            content = image_class()
+            for i in range(num_of_segments):
+                header = entry.read(CACHE_SEGMENT_HEADER.size)
+                if(len(header) != CACHE_SEGMENT_HEADER.size):
+                    return None
+                (addr, length) = CACHE_SEGMENT_HEADER.unpack(header)
+                data = bytearray(length)
+                if(entry.readinto(data) != length):
+                    return None
+                content[addr] = data
+        except (IOError, OSError, struct.error):
+            return None
+        finally:
+            entry.close()
+
+        # store the new modification time of a touched file, so its content
+        # isn't hashed again, and mark entry as recently used
+        try:
+            if(touched == True):
+                entry = open(entry_name, 'r+b')
+                try:
+                    entry.write(CACHE_HEADER.pack(CACHE_MAGIC, size,
+                        stat.st_mtime, content_hash, num_of_segments))
+                finally:
+                    entry.close()
+            os.utime(entry_name, None)
+        except (IOError, OSError):
+            pass
+
+        if(self.verbose_mode == True):
+            print "Loaded parsed content from cache entry", entry_name
+        return content
+
+    #---------------------------------------------------------------------------
+    # store parsed content of the TI-TXT file in the cache
+    #---------------------------------------------------------------------------
+    def store(self, file_name, content):
+        temp_name = None
+        try:
+            if(not os.path.isdir(self.cache_dir)):
+                os.makedirs(self.cache_dir)
+            stat = os.stat(file_name)
+            content_hash = self.get_content_hash(file_name)
+
+            # write to temporary file first, then rename it to the entry name
+            (fd, temp_name) = tempfile.mkstemp(suffix=".tmp",
+                dir=self.cache_dir)
+            entry = os.fdopen(fd, 'wb')
+            try:
+                addr_list = content.keys()
+                addr_list.sort()
+                entry.write(CACHE_HEADER.pack(CACHE_MAGIC, stat.st_size,
+                    stat.st_mtime, content_hash, len(addr_list)))
+                for addr in addr_list:
+                    # segments may also be lists of integers
+                    data = content[addr]
+                    if(not isinstance(data, bytearray)):
+                        data = bytearray(data)
+                    entry.write(CACHE_SEGMENT_HEADER.pack(addr, len(data)))
+                    entry.write(data)
+            finally:
+                entry.close()
+            entry_name = self.get_entry_name(file_name)
+            if((os.name == 'nt') and os.path.exists(entry_name)):
+                os.remove(entry_name)
+            os.rename(temp_name, entry_name)
+        except (IOError, OSError, struct.error):
+            if(self.verbose_mode == True):
+                print "Failed to store cache entry for", file_name
+            # don't leave the temporary file behind, evict() ignores it
+            if((temp_name != None) and os.path.exists(temp_name)):
+                try:
+                    os.remove(temp_name)
+                except OSError:
+                    pass
+            return False
+
+        if(self.verbose_mode == True):
+            print "Stored parsed content in cache entry", entry_name
+
+        # remove least recently used entries if necessary
+        self.evict()
+        return True
+
+    #---------------------------------------------------------------------------
+    # remove least recently used entries until the cache size fits max_size
+    #---------------------------------------------------------------------------
+    def evict(self):
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.cache_dir):
+            if(name.endswith(CACHE_EXT)):
+                entry_name = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(entry_name)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry_name))
+                total_size += stat.st_size
+
+        # oldest entry first
+        entries.sort()
+        for (mtime, size, entry_name) in entries:
+            if(total_size <= self.max_size):
+                break
+            try:
+                os.remove(entry_name)
+                total_size -= size
+                if(self.verbose_mode == True):
+                    print "Evicted cache entry", entry_name
+            except OSError:
+                pass
+
+#---------------------------------------------------------------------------
+# add the cache related command line options to OptionParser
+#---------------------------------------------------------------------------
+def add_cache_options(cmd_line_parser):
+    cmd_line_parser.add_option("--cache-dir", action="store", type="string",
+            dest="cache_dir", default=os.environ.get(CACHE_DIR_ENV),
+            help="cache parsed TI-TXT files in directory CACHE_DIR " +
+            "(default: $" + CACHE_DIR_ENV + ")", metavar="CACHE_DIR")
+    cmd_line_parser.add_option("--cache-size", action="store", type="int",
+            dest="cache_size", default=CACHE_MAX_SIZE,
+            help="maximum size of the cache directory in bytes CACHE_SIZE",
+            metavar="CACHE_SIZE")
+    cmd_line_parser.add_option("--no-cache", action="store_true",
+            dest="no_cache", help="bypass the parse cache")
+
+#---------------------------------------------------------------------------
+# create cache from the command line options, returns None if disabled
+#---------------------------------------------------------------------------
+def get_cache(options, verbose=False):
+    if((options.no_cache == True) or (options.cache_dir == None)):
+        return None
+    return TiTxtCache(options.cache_dir, options.cache_size, verbose)
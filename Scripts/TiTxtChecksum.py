@@ -0,0 +1,300 @@
+#===============================================================================
+# Copyright (c) 2013, Leo Hendrawan
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the Leo Hendrawan nor the
+#    names of its contributors may be used to endorse or promote products
+#    derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY LEO HENDRAWAN ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#===============================================================================
+
+#===============================================================================
+# Name:        TiTxtChecksum.py
+#
+# Description: Checksum algorithms for TI-TXT images: MSP-GANG word sum,
+#              MSP430G2xx BSL XOR checksum, OpenBSL rotate-and-add checksum,
+#              CRC16 and CRC32
+#
+# Author:      Leo Hendrawan
+#
+# Version:     0.4
+#
+# Licence:     BSD license
+#
+# Note:        All functions work on whole buffers (str, bytearray, buffer,
+#              list of integers, TiTxtPaddedSegment or TiTxtOverlaySegment).
+#              NumPy is used if it is installed. The OpenBSL checksum can't be
+#              vectorized since every step depends on the previous one, it is
+#              calculated with a rotation table.
+#
+# Log:
+#     - Version 0.4 (2026.10.18) :
+#       Hello World! (created)
+#       * adding incremental checksum classes for the checksum algorithms,
+#         which can be created by name with new_checksum()
+#
+#===============================================================================
+#!/usr/bin/env python
+
+import sys
+import array
+import binascii
+import hashlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#===============================================================================
+# Constants
+#===============================================================================
+# size of the blocks which are processed at once
+CHKSUM_BLOCK_SIZE = 64 * 1024
+
+# high byte of the last word of a section with odd length (MSP-GANG)
+MSP_GANG_FILL_BYTE = 0xFF
+
+# CRC16-CCITT initial value
+CRC16_INIT = 0xFFFF
+
+# checksum algorithm names
+CHKSUM_MSP_GANG = "msp-gang"
+CHKSUM_XOR = "xor"
+CHKSUM_OPEN_BSL = "openbsl"
+CHKSUM_CRC16 = "crc16"
+CHKSUM_CRC32 = "crc32"
+CHKSUM_SHA256 = "sha256"
+
+# OpenBSL checksum: 16 bit rotate right by one bit for every checksum value
+OPEN_BSL_ROTR_TABLE = array.array('H',
+    [((cs >> 1) | ((cs & 0x01) << 15)) for cs in xrange(0x10000)])
+
+
+#---------------------------------------------------------------------------
+# iterate over the data in blocks which support the buffer interface
+#---------------------------------------------------------------------------
+def iter_blocks(data):
+    if(isinstance(data, list)):
+        data = bytearray(data)
+    if(hasattr(data, 'iter_chunks')):
+        # padded segment
+        for chunk in data.iter_chunks(CHKSUM_BLOCK_SIZE):
+            yield chunk
+    elif(len(data) <= CHKSUM_BLOCK_SIZE):
+        yield data
+    else:
+        for idx in xrange(0, len(data), CHKSUM_BLOCK_SIZE):
+            yield buffer(data, idx, CHKSUM_BLOCK_SIZE)
+
+#---------------------------------------------------------------------------
+# sum of the little endian 16 bit words in the data (length must be even)
+#---------------------------------------------------------------------------
+def word_sum(data):
+    cs = 0
+    for block in iter_blocks(data):
+        if(numpy != None):
+            cs += int(numpy.frombuffer(block, dtype='<u2').sum(
+                dtype=numpy.uint64))
+        else:
+            words = array.array('H')
+            words.fromstring(buffer(block))
+            if(sys.byteorder != 'little'):
+                words.byteswap()
+            cs += sum(words)
+    return cs
+
+#---------------------------------------------------------------------------
+# XOR of all bytes in the data (MSP430G2xx BSL checksum)
+#---------------------------------------------------------------------------
+def xor_checksum(data, checksum=0):
+    for block in iter_blocks(data):
+        if(len(block) == 0):
+            continue
+        if(numpy != None):
+            checksum ^= int(numpy.bitwise_xor.reduce(
+                numpy.frombuffer(block, dtype=numpy.uint8)))
+            continue
+        # fold the data as one big integer in halves down to one byte
+        value = int(binascii.hexlify(block), 16)
+        width = 8
+        while(width < (8 * len(block))):
+            width *= 2
+        while(width > 8):
+            width //= 2
+            value = (value >> width) ^ (value & ((1 << width) - 1))
+        checksum ^= value
+    return checksum
+
+#---------------------------------------------------------------------------
+# OpenBSL checksum: for every byte, rotate the 16 bit checksum right by one
+# bit and add the byte
+#---------------------------------------------------------------------------
+def open_bsl_checksum(data, checksum=0):
+    rotr = OPEN_BSL_ROTR_TABLE
+    for block in iter_blocks(data):
+        for byte in bytearray(block):
+            checksum = (rotr[checksum] + byte) & 0xFFFF
+    return checksum
+
+#---------------------------------------------------------------------------
+# CRC16-CCITT (polynomial 0x1021) of the data
+#---------------------------------------------------------------------------
+def crc16(data, crc=CRC16_INIT):
+    for block in iter_blocks(data):
+        crc = binascii.crc_hqx(buffer(block), crc)
+    return crc
+
+#---------------------------------------------------------------------------
+# CRC32 (as used by zip) of the data
+#---------------------------------------------------------------------------
+def crc32(data, crc=0):
+    for block in iter_blocks(data):
+        crc = binascii.crc32(buffer(block), crc) & 0xFFFFFFFF
+    return crc
+
+#===============================================================================
+# MSP-GANG checksum class - accumulates the checksum of TI-TXT records
+#===============================================================================
+class MspGangChecksum:
+    #---------------------------------------------------------------------------
+    # Every section is summed as little endian 16 bit words, the last word of
+    # a section with odd length is filled up with MSP_GANG_FILL_BYTE. The data
+    # of a section can be added in several parts with any length.
+    #---------------------------------------------------------------------------
+
+    #---------------------------------------------------------------------------
+    # init function - instantiation operation
+    #---------------------------------------------------------------------------
+    def __init__(self):
+        self.checksum = 0
+        # low byte of the incomplete last word of the current section
+        self.low_byte = None
+
+    #---------------------------------------------------------------------------
+    # start new section
+    #---------------------------------------------------------------------------
+    def new_section(self):
+        if(self.low_byte != None):
+            self.checksum += self.low_byte + (MSP_GANG_FILL_BYTE * 256)
+            self.low_byte = None
+
+    #---------------------------------------------------------------------------
+    # add data of the current section
+    #---------------------------------------------------------------------------
+    def update(self, data):
+        for block in iter_blocks(data):
+            block = buffer(block)
+            start = 0
+            end = len(block)
+            if(end == 0):
+                continue
+            # complete the incomplete last word
+            if(self.low_byte != None):
+                self.checksum += self.low_byte + (ord(block[0]) * 256)
+                self.low_byte = None
+                start = 1
+            # keep the byte of an incomplete last word
+            if(((end - start) % 2) != 0):
+                end -= 1
+                self.low_byte = ord(block[end])
+            self.checksum += word_sum(buffer(block, start, end - start))
+
+    #---------------------------------------------------------------------------
+    # get the checksum (incomplete last word is filled up)
+    #---------------------------------------------------------------------------
+    def get_checksum(self):
+        self.new_section()
+        return self.checksum
+
+#===============================================================================
+# incremental checksum class for the checksum functions above
+#===============================================================================
+class FuncChecksum:
+    #---------------------------------------------------------------------------
+    # init function - func(data, checksum) is the checksum function and
+    # initial the initial checksum value
+    #---------------------------------------------------------------------------
+    def __init__(self, func, initial):
+        self.func = func
+        self.checksum = initial
+
+    #---------------------------------------------------------------------------
+    # add data
+    #---------------------------------------------------------------------------
+    def update(self, data):
+        self.checksum = self.func(data, self.checksum)
+
+    #---------------------------------------------------------------------------
+    # get the checksum
+    #---------------------------------------------------------------------------
+    def get_checksum(self):
+        return self.checksum
+
+#===============================================================================
+# SHA-256 checksum class - the checksum is the hex digest string
+#===============================================================================
+class Sha256Checksum:
+    #---------------------------------------------------------------------------
+    # init function - instantiation operation
+    #---------------------------------------------------------------------------
+    def __init__(self):
+        self.sha256 = hashlib.sha256()
+
+    #---------------------------------------------------------------------------
+    # add data
+    #---------------------------------------------------------------------------
+    def update(self, data):
+        for block in iter_blocks(data):
+            self.sha256.update(buffer(block))
+
+    #---------------------------------------------------------------------------
+    # get the checksum
+    #---------------------------------------------------------------------------
+    def get_checksum(self):
+        return self.sha256.hexdigest()
+
+#---------------------------------------------------------------------------
+# create incremental checksum object (with update() and get_checksum()
+# methods) for the given algorithm name, None for unknown algorithm
+#---------------------------------------------------------------------------
+def new_checksum(algorithm):
+    if(algorithm == CHKSUM_MSP_GANG):
+        return MspGangChecksum()
+    elif(algorithm == CHKSUM_XOR):
+        return FuncChecksum(xor_checksum, 0)
+    elif(algorithm == CHKSUM_OPEN_BSL):
+        return FuncChecksum(open_bsl_checksum, 0)
+    elif(algorithm == CHKSUM_CRC16):
+        return FuncChecksum(crc16, CRC16_INIT)
+    elif(algorithm == CHKSUM_CRC32):
+        return FuncChecksum(crc32, 0)
+    elif(algorithm == CHKSUM_SHA256):
+        return Sha256Checksum()
+    return None
+
+#---------------------------------------------------------------------------
+# calculate checksum of the data with the given algorithm name
+#---------------------------------------------------------------------------
+def calc_checksum(algorithm, data):
+    checksum = new_checksum(algorithm)
+    checksum.update(data)
+    return checksum.get_checksum()
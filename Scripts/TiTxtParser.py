@@ -33,7 +33,7 @@
 #
 # Author:      Leo Hendrawan
 #
-# Version:     0.3
+# Version:     0.4
 #
 # Licence:     New BSD license
 #
@@ -50,12 +50,700 @@
 #     - Version 0.3 (2013.06.29):
 #        * bug fix in the print_ti_txt() and fill() method
 #        * some typo bug fixes
+#     - Version 0.4 (2026.10.18):
+#        * adding TiTxtImage class, parsed content is stored as address sorted
+#          bytearray segments instead of lists of integers
+#        * parse() decodes batches of data lines with bytearray.fromhex()
+#        * adding iter_records() generator for parsing TI-TXT streams, parse()
+#          also accepts file objects and '-' for stdin
+#        * adding parse_mmap() method for parsing memory mapped files
+#        * adding parse_parallel() method for parsing with process pool
+#        * parse() can use persistent parse cache (see TiTxtCache.py)
+#        * TiTxtImage keeps sorted segment index for address lookups,
+#          adding get_addr_ranges() method
+#        * join() detects overlapping address ranges with interval sweep and
+#          doesn't modify the input contents anymore
+#        * adding merge() method for merging any number of contents with
+#          priorities, and parse_manifest() method
+#        * fill() returns TiTxtPaddedSegment which doesn't copy the content
+#          and doesn't expand the filled gaps
+#        * print_ti_txt() formats blocks of data at once and supports upper
+#          case hex digits
+#        * adding TiTxtWriter class for writing TI-TXT files incrementally
+#        * adding parse_file() and print_file() methods for reading and
+#          writing raw binary, Intel HEX and Motorola S-record files
+#        * TiTxtImage memoizes checksums per segment, parse() can calculate
+#          them while parsing (see set_checksum_algorithms())
+#        * adding TiTxtOverlayImage class for copy-on-write variants of an
+#          image
+#        * TiTxtImage can be copied with copy.deepcopy() and pickled
+#        * parse_parallel() reuses its process pool and parses small files
+#          with parse()
+#        * print_file() accepts segments given as lists of integers in all
+#          file formats, adding --test option
 #
 #===============================================================================
 #!/usr/bin/env python
 
 import sys
 import optparse
+import bisect
+import string
+import os
+import mmap
+import functools
+import multiprocessing
+import itertools
+import heapq
+import binascii
+import tempfile
+import shutil
+import TiTxtChecksum
+import TiTxtCache
+
+#===============================================================================
+# Constants
+#===============================================================================
+# number of data lines which are decoded together while parsing
+DECODE_BATCH_LINES = 4096
+
+# size of the chunks (in characters) which are decoded in parallel
+PARALLEL_CHUNK_SIZE = 1024 * 1024
+
+# minimum TI-TXT file size for parsing in parallel, smaller files are parsed
+# faster with parse() than the process pool can exchange the chunks
+PARALLEL_MIN_FILE_SIZE = 4 * PARALLEL_CHUNK_SIZE
+
+# maximum size of the chunks of padded segments while iterating
+FILL_CHUNK_SIZE = 64 * 1024
+
+# number of data bytes per line in TI-TXT file
+BYTES_PER_LINE = 16
+
+# number of data bytes which are formatted at once while writing (must be
+# multiple of BYTES_PER_LINE), and size of the output file buffer
+WRITE_BLOCK_SIZE = 64 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# supported file formats
+FORMAT_TI_TXT = "ti-txt"
+FORMAT_BIN = "bin"
+FORMAT_IHEX = "ihex"
+FORMAT_SREC = "srec"
+FILE_FORMATS = [FORMAT_TI_TXT, FORMAT_BIN, FORMAT_IHEX, FORMAT_SREC]
+
+# file name extensions of the supported file formats (default: TI-TXT)
+FILE_EXTENSIONS = {
+    ".txt": FORMAT_TI_TXT,
+    ".bin": FORMAT_BIN,
+    ".hex": FORMAT_IHEX,
+    ".ihex": FORMAT_IHEX,
+    ".ihx": FORMAT_IHEX,
+    ".srec": FORMAT_SREC,
+    ".s19": FORMAT_SREC,
+    ".s28": FORMAT_SREC,
+    ".s37": FORMAT_SREC,
+    ".mot": FORMAT_SREC,
+}
+
+# number of data bytes per Intel HEX / S-record data record
+RECORD_DATA_LEN = 16
+
+# translation table for replacing whitespaces with space (for fromhex())
+WHITESPACE_TO_SPACE = string.maketrans("\t\n\r\v\f", "     ")
+
+#===============================================================================
+# TI-TXT image class
+#===============================================================================
+class TiTxtImage(dict):
+    #---------------------------------------------------------------------------
+    # The image is a dictionary of start address -> bytearray segment, so it
+    # can still be used everywhere the old dictionary of lists was used (e.g.
+    # keys(), content[addr][idx], content == {}). The start addresses are kept
+    # sorted in addr_list, and every segment is converted to bytearray, which
+    # needs one byte of memory per firmware byte instead of a list entry plus
+    # an integer object.
+    # Segments can also be added as lazy segments, which are only decoded by
+    # their loader function when they are accessed the first time.
+    # Checksums of the segments are memoized, they are dropped when a segment
+    # is replaced or patched with patch(). Segment bytes which are modified
+    # directly need invalidate_checksums() to be called.
+    #---------------------------------------------------------------------------
+
+    #---------------------------------------------------------------------------
+    # init function - instantiation operation
+    #---------------------------------------------------------------------------
+    def __init__(self, content=None):
+        dict.__init__(self)
+        # sorted list of segment start addresses
+        self.addr_list = []
+        # loader functions of segments which haven't been decoded yet
+        self.lazy_segments = {}
+        # memoized checksums: address -> {algorithm name: checksum}
+        self.checksums = {}
+        if(content != None):
+            self.update(content)
+
+    #---------------------------------------------------------------------------
+    # add or replace segment (data is converted to bytearray if necessary,
+    # except for TiTxtPaddedSegment and TiTxtOverlaySegment)
+    #---------------------------------------------------------------------------
+    def __setitem__(self, addr, data):
+        if(not isinstance(data, (bytearray, TiTxtPaddedSegment))):
+            data = bytearray(data)
+        if(not dict.__contains__(self, addr)):
+            bisect.insort(self.addr_list, addr)
+        self.lazy_segments.pop(addr, None)
+        self.checksums.pop(addr, None)
+        dict.__setitem__(self, addr, data)
+
+    #---------------------------------------------------------------------------
+    # add lazy segment, loader is called to get the segment data on first
+    # access
+    #---------------------------------------------------------------------------
+    def set_lazy_segment(self, addr, loader):
+        if(not dict.__contains__(self, addr)):
+            bisect.insort(self.addr_list, addr)
+        dict.__setitem__(self, addr, None)
+        self.lazy_segments[addr] = loader
+        self.checksums.pop(addr, None)
+
+    #---------------------------------------------------------------------------
+    # decode lazy segment(s)
+    #---------------------------------------------------------------------------
+    def load_segment(self, addr):
+        if(addr in self.lazy_segments):
+            data = self.lazy_segments[addr]()
+            checksums = self.checksums.get(addr)
+            self[addr] = data
+            if(checksums != None):
+                self.checksums[addr] = checksums
+
+    def load_all(self):
+        for addr in self.lazy_segments.keys():
+            self.load_segment(addr)
+
+    #---------------------------------------------------------------------------
+    # get segment
+    #---------------------------------------------------------------------------
+    def __getitem__(self, addr):
+        if(addr in self.lazy_segments):
+            self.load_segment(addr)
+        return dict.__getitem__(self, addr)
+
+    def get(self, addr, default=None):
+        if(dict.__contains__(self, addr)):
+            return self[addr]
+        return default
+
+    #---------------------------------------------------------------------------
+    # remove segment
+    #---------------------------------------------------------------------------
+    def __delitem__(self, addr):
+        dict.__delitem__(self, addr)
+        self.lazy_segments.pop(addr, None)
+        self.checksums.pop(addr, None)
+        del self.addr_list[bisect.bisect_left(self.addr_list, addr)]
+
+    #---------------------------------------------------------------------------
+    # dictionary methods which have to keep the address list up to date
+    #---------------------------------------------------------------------------
+    def update(self, content):
+        for addr in content.keys():
+            self[addr] = content[addr]
+
+    def pop(self, addr, *default):
+        if(dict.__contains__(self, addr)):
+            data = self[addr]
+            del self[addr]
+            return data
+        return dict.pop(self, addr, *default)
+
+    def setdefault(self, addr, data=None):
+        if(not dict.__contains__(self, addr)):
+            if(data == None):
+                data = bytearray()
+            self[addr] = data
+        return self[addr]
+
+    def popitem(self):
+        if(len(self.addr_list) == 0):
+            raise KeyError("popitem(): image is empty")
+        addr = self.addr_list[-1]
+        return (addr, self.pop(addr))
+
+    def clear(self):
+        dict.clear(self)
+        self.addr_list = []
+        self.lazy_segments = {}
+        self.checksums = {}
+
+    def copy(self):
+        image = TiTxtImage()
+        for addr in self.addr_list:
+            image[addr] = self[addr][:]
+        for (addr, checksums) in self.checksums.items():
+            image.checksums[addr] = dict(checksums)
+        return image
+
+    #---------------------------------------------------------------------------
+    # copy and pickle support: the dictionary items are not restored one by
+    # one (which would add every address to addr_list a second time), the
+    # image is rebuilt from its segments and memoized checksums instead
+    #---------------------------------------------------------------------------
+    def __deepcopy__(self, memo):
+        image = self.copy()
+        memo[id(self)] = image
+        return image
+
+    def __reduce__(self):
+        content = {}
+        for addr in self.addr_list:
+            content[addr] = self[addr][:]
+        checksums = {}
+        for (addr, addr_checksums) in self.checksums.items():
+            checksums[addr] = dict(addr_checksums)
+        return (TiTxtImage, (content,), {'checksums': checksums})
+
+    #---------------------------------------------------------------------------
+    # dictionary methods which have to decode the lazy segments
+    #---------------------------------------------------------------------------
+    def values(self):
+        return [self[addr] for addr in self.addr_list]
+
+    def items(self):
+        return [(addr, self[addr]) for addr in self.addr_list]
+
+    def itervalues(self):
+        for addr in self.addr_list:
+            yield self[addr]
+
+    def iteritems(self):
+        for addr in self.addr_list:
+            yield (addr, self[addr])
+
+    def __eq__(self, other):
+        # different number of segments, no need to decode anything
+        if((not isinstance(other, dict)) or (len(other) != len(self))):
+            return False
+        # segments are compared by value, so an image also equals the
+        # dictionary of lists of integers it was created from
+        for addr in self.addr_list:
+            if(addr not in other):
+                return False
+            data = other[addr]
+            if(not isinstance(data, (bytearray, TiTxtPaddedSegment))):
+                try:
+                    data = bytearray(data)
+                except (TypeError, ValueError):
+                    return False
+            if(self[addr] != data):
+                return False
+        return True
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    #---------------------------------------------------------------------------
+    # get sorted list of segment start addresses
+    #---------------------------------------------------------------------------
+    def sorted_addrs(self):
+        return list(self.addr_list)
+
+    #---------------------------------------------------------------------------
+    # get start address of the first segment (-1 if image is empty)
+    #---------------------------------------------------------------------------
+    def get_start_addr(self):
+        if(len(self.addr_list) == 0):
+            return -1
+        return self.addr_list[0]
+
+    #---------------------------------------------------------------------------
+    # get end address of the last segment (-1 if image is empty)
+    #---------------------------------------------------------------------------
+    def get_end_addr(self):
+        if(len(self.addr_list) == 0):
+            return -1
+        addr = self.addr_list[-1]
+        return addr + self.get_segment_len(addr) - 1
+
+    #---------------------------------------------------------------------------
+    # get length of segment, lazy segments are decoded if necessary
+    #---------------------------------------------------------------------------
+    def get_segment_len(self, addr):
+        return len(self[addr])
+
+    #---------------------------------------------------------------------------
+    # get start address of the segment which holds addr, None if not found
+    #---------------------------------------------------------------------------
+    def find_segment(self, addr):
+        idx = bisect.bisect_right(self.addr_list, addr) - 1
+        if(idx < 0):
+            return None
+        start_addr = self.addr_list[idx]
+        if(addr < start_addr + self.get_segment_len(start_addr)):
+            return start_addr
+        return None
+
+    #---------------------------------------------------------------------------
+    # get start addresses of all segments overlapping the range between
+    # start_addr and end_addr (inclusive), in ascending order
+    #---------------------------------------------------------------------------
+    def find_segments(self, start_addr, end_addr):
+        idx = bisect.bisect_right(self.addr_list, start_addr) - 1
+        # the segment before start_addr may reach into the range
+        if((idx < 0) or (self.addr_list[idx] +
+                self.get_segment_len(self.addr_list[idx]) <= start_addr)):
+            idx += 1
+        stop = bisect.bisect_right(self.addr_list, end_addr)
+        return self.addr_list[idx:stop]
+
+    #---------------------------------------------------------------------------
+    # iterate over (address, data) of the data bytes between start_addr and
+    # end_addr (inclusive), in ascending order
+    #---------------------------------------------------------------------------
+    def iter_range(self, start_addr, end_addr):
+        for addr in self.find_segments(start_addr, end_addr):
+            data = self[addr]
+            first = max(start_addr, addr)
+            last = min(end_addr, addr + len(data) - 1)
+            yield (first, data[(first - addr):(last - addr + 1)])
+
+    #---------------------------------------------------------------------------
+    # get list of address ranges (xrange objects) of the segments in
+    # ascending order
+    #---------------------------------------------------------------------------
+    def get_addr_ranges(self):
+        return [xrange(addr, addr + self.get_segment_len(addr))
+            for addr in self.addr_list]
+
+    #---------------------------------------------------------------------------
+    # iterate over the segments as (address, data) records in the same way as
+    # TiTxtParser.iter_records(): every segment starts with an empty record
+    #---------------------------------------------------------------------------
+    def iter_records(self):
+        for addr in self.sorted_addrs():
+            yield (addr, bytearray())
+            yield (addr, self[addr])
+
+    #---------------------------------------------------------------------------
+    # get checksum of segment with the given algorithm name (see
+    # TiTxtChecksum), calculated only if it's not memoized yet
+    #---------------------------------------------------------------------------
+    def get_segment_checksum(self, addr, algorithm):
+        checksums = self.checksums.setdefault(addr, {})
+        if(algorithm not in checksums):
+            checksums[algorithm] = TiTxtChecksum.calc_checksum(algorithm,
+                self[addr])
+        return checksums[algorithm]
+
+    #---------------------------------------------------------------------------
+    # memoize checksum of segment which was calculated elsewhere
+    #---------------------------------------------------------------------------
+    def set_segment_checksum(self, addr, algorithm, checksum):
+        self.checksums.setdefault(addr, {})[algorithm] = checksum
+
+    #---------------------------------------------------------------------------
+    # drop memoized checksums of segment
+    #---------------------------------------------------------------------------
+    def invalidate_checksums(self, addr):
+        self.checksums.pop(addr, None)
+
+    #---------------------------------------------------------------------------
+    # overwrite image bytes starting at address addr, all bytes must be
+    # inside the segments. Only the checksums of the patched segments are
+    # dropped. Returns False if the bytes are not inside the segments
+    #---------------------------------------------------------------------------
+    def patch(self, addr, data):
+        end_addr = addr + len(data) - 1
+        seg_addrs = self.find_segments(addr, end_addr)
+
+        # check that the segments cover all bytes
+        next_addr = addr
+        for seg_addr in seg_addrs:
+            if(seg_addr > next_addr):
+                return False
+            next_addr = seg_addr + self.get_segment_len(seg_addr)
+        if(next_addr <= end_addr):
+            return False
+
+        for seg_addr in seg_addrs:
+            first = max(addr, seg_addr)
+            last = min(end_addr, seg_addr + self.get_segment_len(seg_addr) - 1)
+            self.patch_segment(seg_addr, first - seg_addr,
+                data[(first - addr):(last - addr + 1)])
+            self.invalidate_checksums(seg_addr)
+        return True
+
+    #---------------------------------------------------------------------------
+    # overwrite bytes of segment at address addr starting at offset
+    #---------------------------------------------------------------------------
+    def patch_segment(self, addr, offset, data):
+        segment = self[addr]
+        if(not isinstance(segment, bytearray)):
+            # virtual segments can't be modified, expand it
+            segment = bytearray(segment[0:len(segment)])
+            self[addr] = segment
+        segment[offset:(offset + len(data))] = data
+
+    #---------------------------------------------------------------------------
+    # get total number of data bytes in the image
+    #---------------------------------------------------------------------------
+    def get_size(self):
+        size = 0
+        for data in self.values():
+            size += len(data)
+        return size
+
+    #---------------------------------------------------------------------------
+    # compatibility view: dictionary of start address -> list of integers
+    #---------------------------------------------------------------------------
+    def as_dict(self):
+        content = {}
+        for addr in self.addr_list:
+            content[addr] = list(self[addr])
+        return content
+
+#===============================================================================
+# TI-TXT overlay image class - copy-on-write variant of an image
+#===============================================================================
+class TiTxtOverlayImage(TiTxtImage):
+    #---------------------------------------------------------------------------
+    # The overlay image references the segments of the base image, which is
+    # never modified. Bytes which are changed with patch() are stored in
+    # TiTxtOverlaySegment objects on top of the base segments, so a variant
+    # of the image only needs memory for its patched bytes. The memoized
+    # checksums of the base image are taken over for the unpatched segments.
+    #---------------------------------------------------------------------------
+
+    #---------------------------------------------------------------------------
+    # init function - instantiation operation
+    #---------------------------------------------------------------------------
+    def __init__(self, base):
+        TiTxtImage.__init__(self)
+        self.base = base
+        # overlay segments created by this image: address -> segment
+        self.own_segments = {}
+        # the base addresses are already sorted
+        self.addr_list = self.get_base_addrs()
+        for addr in self.addr_list:
+            if(isinstance(base, TiTxtImage) and (addr in base.lazy_segments)):
+                # keep the base segment lazy
+                dict.__setitem__(self, addr, None)
+                self.lazy_segments[addr] = functools.partial(
+                    base.__getitem__, addr)
+            else:
+                data = base[addr]
+                if(not isinstance(data, (bytearray, TiTxtPaddedSegment))):
+                    data = bytearray(data)
+                dict.__setitem__(self, addr, data)
+        if(isinstance(base, TiTxtImage)):
+            for (addr, checksums) in base.checksums.items():
+                self.checksums[addr] = dict(checksums)
+
+    #---------------------------------------------------------------------------
+    # get sorted start addresses of the base image
+    #---------------------------------------------------------------------------
+    def get_base_addrs(self):
+        if(isinstance(self.base, TiTxtImage)):
+            return self.base.sorted_addrs()
+        return sorted(self.base.keys())
+
+    #---------------------------------------------------------------------------
+    # overwrite bytes of segment at address addr starting at offset, the
+    # bytes are stored in overlay segment
+    #---------------------------------------------------------------------------
+    def patch_segment(self, addr, offset, data):
+        segment = self[addr]
+        # segments which are not created here may be shared, e.g. overlay
+        # segments of the base image
+        if(self.own_segments.get(addr) is not segment):
+            segment = TiTxtOverlaySegment(segment)
+            self[addr] = segment
+            self.own_segments[addr] = segment
+        segment.patch(offset, data)
+
+    #---------------------------------------------------------------------------
+    # get total number of patched bytes
+    #---------------------------------------------------------------------------
+    def get_patch_size(self):
+        size = 0
+        for (addr, segment) in self.own_segments.items():
+            if(dict.get(self, addr) is segment):
+                size += segment.get_patch_size()
+        return size
+
+#===============================================================================
+# Padded segment class - virtual segment returned by TiTxtParser.fill()
+#===============================================================================
+class TiTxtPaddedSegment(object):
+    #---------------------------------------------------------------------------
+    # The padded segment has a fixed length, it references the data of the
+    # original segments at their offsets and describes the gaps between them
+    # only with the fill byte, so creating it costs O(segments). It can be
+    # used like a bytearray for reading: len(), indexing, slicing (which
+    # returns a new bytearray) and iterating.
+    #---------------------------------------------------------------------------
+
+    #---------------------------------------------------------------------------
+    # init function - instantiation operation
+    #---------------------------------------------------------------------------
+    def __init__(self, length, fill_byte):
+        self.length = length
+        self.fill_byte = fill_byte
+        # sorted offsets of the referenced data and the data itself
+        self.offsets = []
+        self.runs = []
+
+    #---------------------------------------------------------------------------
+    # add data at given offset, data must be added in ascending offset order
+    #---------------------------------------------------------------------------
+    def add_data(self, offset, data):
+        self.offsets.append(offset)
+        self.runs.append(data)
+
+    #---------------------------------------------------------------------------
+    # get length
+    #---------------------------------------------------------------------------
+    def __len__(self):
+        return self.length
+
+    #---------------------------------------------------------------------------
+    # get copy of the bytes between start and stop offset as bytearray
+    #---------------------------------------------------------------------------
+    def get_slice(self, start, stop):
+        start = max(0, min(start, self.length))
+        stop = max(start, min(stop, self.length))
+        data = self.get_fill(start, stop)
+        # copy the referenced data which overlaps the requested range
+        idx = max(bisect.bisect_right(self.offsets, start) - 1, 0)
+        while((idx < len(self.offsets)) and (self.offsets[idx] < stop)):
+            offset = self.offsets[idx]
+            run = self.runs[idx]
+            first = max(start, offset)
+            last = min(stop, offset + len(run))
+            if(first < last):
+                data[(first - start):(last - start)] = \
+                    run[(first - offset):(last - offset)]
+            idx += 1
+        return data
+
+    #---------------------------------------------------------------------------
+    # get single byte or slice
+    #---------------------------------------------------------------------------
+    def __getitem__(self, idx):
+        if(isinstance(idx, slice)):
+            (start, stop, step) = idx.indices(self.length)
+            if(step == 1):
+                return self.get_slice(start, stop)
+            return self.get_slice(0, self.length)[idx]
+        if(idx < 0):
+            idx += self.length
+        if((idx < 0) or (idx >= self.length)):
+            raise IndexError("padded segment index out of range")
+        run_idx = bisect.bisect_right(self.offsets, idx) - 1
+        if(run_idx >= 0):
+            offset = self.offsets[run_idx]
+            if(idx < offset + len(self.runs[run_idx])):
+                return self.runs[run_idx][idx - offset]
+        return self.get_fill_byte(idx)
+
+    #---------------------------------------------------------------------------
+    # get the bytes between start and stop offset which are not referenced
+    # data (as new bytearray), and single byte at offset idx
+    #---------------------------------------------------------------------------
+    def get_fill(self, start, stop):
+        return bytearray([self.fill_byte]) * (stop - start)
+
+    def get_fill_byte(self, idx):
+        return self.fill_byte
+
+    #---------------------------------------------------------------------------
+    # iterate over the padded data in chunks (bytearray) of maximum chunk_size
+    #---------------------------------------------------------------------------
+    def iter_chunks(self, chunk_size=FILL_CHUNK_SIZE):
+        for start in xrange(0, self.length, chunk_size):
+            yield self.get_slice(start, start + chunk_size)
+
+    #---------------------------------------------------------------------------
+    # iterate over the bytes
+    #---------------------------------------------------------------------------
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            for byte in chunk:
+                yield byte
+
+    #---------------------------------------------------------------------------
+    # compare with other sequence of bytes
+    #---------------------------------------------------------------------------
+    def __eq__(self, other):
+        try:
+            if(len(other) != self.length):
+                return False
+        except TypeError:
+            return False
+        return self[:] == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+#===============================================================================
+# Overlay segment class - patched bytes on top of a read-only base segment
+#===============================================================================
+class TiTxtOverlaySegment(TiTxtPaddedSegment):
+    #---------------------------------------------------------------------------
+    # Works like the padded segment, but the bytes which are not patched are
+    # read from the base segment instead of the fill byte. The patched bytes
+    # are kept as sorted, non overlapping runs.
+    #---------------------------------------------------------------------------
+
+    #---------------------------------------------------------------------------
+    # init function - instantiation operation
+    #---------------------------------------------------------------------------
+    def __init__(self, base):
+        TiTxtPaddedSegment.__init__(self, len(base), None)
+        self.base = base
+
+    #---------------------------------------------------------------------------
+    # get the base bytes between start and stop offset, and single base byte
+    #---------------------------------------------------------------------------
+    def get_fill(self, start, stop):
+        return bytearray(self.base[start:stop])
+
+    def get_fill_byte(self, idx):
+        return self.base[idx]
+
+    #---------------------------------------------------------------------------
+    # overwrite bytes starting at offset, runs which overlap or touch the
+    # patched bytes are merged into one run
+    #---------------------------------------------------------------------------
+    def patch(self, offset, data):
+        if(len(data) == 0):
+            return
+        if((offset < 0) or (offset + len(data) > self.length)):
+            raise IndexError("overlay segment patch out of range")
+        start = offset
+        stop = offset + len(data)
+        # find the runs which overlap or touch the patched bytes
+        first = bisect.bisect_left(self.offsets, start)
+        if((first > 0) and (self.offsets[first - 1] +
+                len(self.runs[first - 1]) >= start)):
+            first -= 1
+        last = bisect.bisect_right(self.offsets, stop)
+        if(first < last):
+            start = min(start, self.offsets[first])
+            stop = max(stop, self.offsets[last - 1] + len(self.runs[last - 1]))
+        # build the merged run
+        run = self.get_slice(start, stop)
+        run[(offset - start):(offset - start + len(data))] = data
+        self.offsets[first:last] = [start]
+        self.runs[first:last] = [run]
+
+    #---------------------------------------------------------------------------
+    # get number of patched bytes
+    #---------------------------------------------------------------------------
+    def get_patch_size(self):
+        return sum([len(run) for run in self.runs])
 
 #===============================================================================
 # TI-TXT class
@@ -66,6 +754,14 @@ class TiTxtParser:
     #---------------------------------------------------------------------------
     # flag for verbose mode
     verbose_mode = False
+    # parse cache (TiTxtCache object), None if disabled
+    cache = None
+    # names of the checksum algorithms (see TiTxtChecksum) which parse()
+    # calculates for every segment
+    checksum_algorithms = []
+    # process pool of parse_parallel() and its number of processes
+    pool = None
+    pool_jobs = None
 
     #---------------------------------------------------------------------------
     # Class functions
@@ -74,9 +770,10 @@ class TiTxtParser:
     #---------------------------------------------------------------------------
     # init function - instantiation operation
     #---------------------------------------------------------------------------
-    def __init__(self, verbose=False):
+    def __init__(self, verbose=False, cache=None):
         # save file name and verbose mode
         self.verbose_mode = verbose
+        self.cache = cache
 
     #---------------------------------------------------------------------------
     # setting verbose mode
@@ -84,121 +781,429 @@ class TiTxtParser:
     def set_verbose_mode(self, verbose):
         self.verbose_mode = verbose
 
+    #---------------------------------------------------------------------------
+    # setting parse cache (None to disable)
+    #---------------------------------------------------------------------------
+    def set_cache(self, cache):
+        self.cache = cache
+
+    #---------------------------------------------------------------------------
+    # setting the checksum algorithms which are calculated while parsing
+    #---------------------------------------------------------------------------
+    def set_checksum_algorithms(self, algorithms):
+        self.checksum_algorithms = list(algorithms)
+
     #---------------------------------------------------------------------------
     # get list of addresses in TI-TXT file content
     #---------------------------------------------------------------------------
     def get_addr_list(self, content):
-        # create empty list
-        addr_list = []
+        return list(itertools.chain.from_iterable(
+            self.get_addr_ranges(content)))
 
-        # get and sort the start addresses
+    #---------------------------------------------------------------------------
+    # get list of address ranges (xrange objects) in TI-TXT file content
+    #---------------------------------------------------------------------------
+    def get_addr_ranges(self, content):
+        if(isinstance(content, TiTxtImage)):
+            return content.get_addr_ranges()
+        return [xrange(addr, addr + len(content[addr]))
+            for addr in self.get_sorted_addrs(content)]
+
+    #---------------------------------------------------------------------------
+    # get sorted list of start addresses in TI-TXT file content
+    #---------------------------------------------------------------------------
+    def get_sorted_addrs(self, content):
+        if(isinstance(content, TiTxtImage)):
+            return content.sorted_addrs()
         start_addresses = content.keys()
         start_addresses.sort()
-
-        # append each address
-        for start_addr in start_addresses:
-            idx = 0
-            for bytes in content[start_addr]:
-                addr_list.append(start_addr + idx)
-                idx += 1
-
-        return addr_list
+        return start_addresses
 
     #---------------------------------------------------------------------------
     # get start address in TI-TXT file content
     #---------------------------------------------------------------------------
     def get_start_addr(self, content):
-        start_addr = -1
-        try:
-            for addr in content.keys():
-                if(start_addr == -1):
-                    # first iteration
-                    start_addr = addr
-                else:
-                    if(addr < start_addr):
-                        # save new start address
-                        start_addr = addr
-        except:
-            pass
-        return start_addr
+        if(isinstance(content, TiTxtImage)):
+            return content.get_start_addr()
+        if(len(content) == 0):
+            return -1
+        return min(content.keys())
 
     #---------------------------------------------------------------------------
     # get end address in TI-TXT file content
     #---------------------------------------------------------------------------
     def get_end_addr(self, content):
-        end_addr = -1
+        if(isinstance(content, TiTxtImage)):
+            return content.get_end_addr()
+        if(len(content) == 0):
+            return -1
+        end_addr = max(content.keys())
+        return end_addr + len(content[end_addr]) - 1
+
+    #---------------------------------------------------------------------------
+    # decode data lines into bytearray, returns None in case of error
+    #---------------------------------------------------------------------------
+    def decode_data_lines(self, data_lines):
+        # fast path: decode all lines with a single fromhex() call
         try:
-            for addr in content.keys():
-                if(end_addr == -1):
-                    # first iteration
-                    end_addr = addr
+            text = "".join(data_lines).translate(WHITESPACE_TO_SPACE)
+            return bytearray.fromhex(text)
+        except ValueError:
+            pass
+
+        # slow path: convert byte by byte, to accept single digit bytes
+        # and to report the token which can't be converted
+        data = bytearray()
+        for line in data_lines:
+            for byte_str in line.split():
+                try:
+                    # convert byte string to integer value
+                    data.append(int(byte_str, 16))
+                except:
+                    if(self.verbose_mode == True):
+                        print "Error while trying to convert: ", byte_str
+                    return None
+        return data
+
+    #---------------------------------------------------------------------------
+    # decode data lines of a record starting at address addr
+    #---------------------------------------------------------------------------
+    def decode_record(self, addr, data_lines):
+        data = self.decode_data_lines(data_lines)
+        if(data == None):
+            raise ValueError("invalid data byte")
+        if((addr == None) and (len(data) != 0)):
+            if(self.verbose_mode == True):
+                print "Error: data found before any start address"
+            raise ValueError("data found before any start address")
+        return data
+
+    #---------------------------------------------------------------------------
+    # iterate over the records of a TI-TXT file (name, '-' for stdin, or file
+    # object). Yields (address, data) tuples in the file order: every section
+    # starts with an empty record at its start address, followed by the data
+    # records of the section. Raises IOError if the file can't be opened and
+    # ValueError in case of parsing error.
+    #---------------------------------------------------------------------------
+    def iter_records(self, file_or_path):
+        # open the input file if necessary
+        if(hasattr(file_or_path, 'read')):
+            file = file_or_path
+        elif(file_or_path == '-'):
+            file = sys.stdin
+        else:
+            if(self.verbose_mode == True):
+                print "Opening TI-TXT File: ", file_or_path
+            file = open(file_or_path, 'r')
+
+        try:
+            # address of the next data byte
+            addr = None
+            # data lines are collected and decoded in batches
+            data_lines = []
+            for line in file:
+                # check if this is a start address line
+                if(line.find('@') != -1):
+                    # decode the remaining data lines of the previous section
+                    data = self.decode_record(addr, data_lines)
+                    data_lines = []
+                    if(len(data) != 0):
+                        yield (addr, data)
+                    try:
+                        addr_num = line.lstrip('@')
+                        addr = int(addr_num,16)
+                    except ValueError:
+                        if(self.verbose_mode == True):
+                            print "Error while parsing: ", line
+                        raise
+                    if(self.verbose_mode == True):
+                        print "Parsing data starting from address",
+                        print hex(addr), "(", addr, ")"
+                    yield (addr, bytearray())
+
+                # check if this is not end line
+                elif(line.strip() != 'q'):
+                    data_lines.append(line)
+                    if(len(data_lines) >= DECODE_BATCH_LINES):
+                        data = self.decode_record(addr, data_lines)
+                        data_lines = []
+                        if(len(data) != 0):
+                            yield (addr, data)
+                            addr += len(data)
+
+            # decode the remaining data lines of the last section
+            data = self.decode_record(addr, data_lines)
+            if(len(data) != 0):
+                yield (addr, data)
+        finally:
+            # close file if it was opened here
+            if((file is not file_or_path) and (file is not sys.stdin)):
+                file.close()
+
+    #---------------------------------------------------------------------------
+    # parse the TI-TXT file (name, '-' for stdin, or file object)
+    #---------------------------------------------------------------------------
+    def parse(self,file_name):
+        if(self.verbose_mode == True):
+            print "\n== Parsing TI-TXT File:", file_name, " =="
+
+        # check the parse cache first
+        use_cache = ((self.cache != None) and isinstance(file_name, str) and
+            (file_name != '-'))
+        if(use_cache == True):
+            content = self.cache.load(file_name, TiTxtImage)
+            if(content != None):
+                return content
+
+        # start parsing
+        content = TiTxtImage()
+        seg_addr = None
+        checksums = []
+        try:
+            for (addr, data) in self.iter_records(file_name):
+                if(len(data) == 0):
+                    # memoize checksums of the previous segment
+                    self.store_checksums(content, seg_addr, checksums)
+                    # add new entry in dictinary
+                    content[addr] = bytearray()
+                    segment = content[addr]
+                    seg_addr = addr
+                    checksums = [TiTxtChecksum.new_checksum(algorithm)
+                        for algorithm in self.checksum_algorithms]
                 else:
-                    if(addr > end_addr):
-                        # save new end address
-                        end_addr = addr
+                    # append in the array, and update checksums
+                    segment.extend(data)
+                    for checksum in checksums:
+                        checksum.update(data)
+            self.store_checksums(content, seg_addr, checksums)
+        except IOError:
+            if(self.verbose_mode == True):
+                print "Error in opening TI-TXT file ", file_name
+            return {}
+        except ValueError:
+            return {}
 
-            # add the length
-            if(end_addr != -1):
-                end_addr += len(content[end_addr]) - 1
-        except:
-            pass
-        return end_addr
+        # save in the parse cache
+        if(use_cache == True):
+            self.cache.store(file_name, content)
+
+        # return content as dictionary
+        return content
+
+    #---------------------------------------------------------------------------
+    # memoize the checksums calculated while parsing segment at address addr
+    #---------------------------------------------------------------------------
+    def store_checksums(self, content, addr, checksums):
+        for (algorithm, checksum) in zip(self.checksum_algorithms, checksums):
+            content.set_segment_checksum(addr, algorithm,
+                checksum.get_checksum())
+
+    #---------------------------------------------------------------------------
+    # decode data bytes in buffer between start and end offset
+    #---------------------------------------------------------------------------
+    def decode_span(self, buf, start, end):
+        data = self.decode_data_lines([buf[start:end]])
+        if(data == None):
+            raise ValueError("invalid data byte")
+        return data
+
+    #---------------------------------------------------------------------------
+    # open and map the TI-TXT file in read only mode, returns None on error
+    #---------------------------------------------------------------------------
+    def map_file(self, file_name):
+        try:
+            if(self.verbose_mode == True):
+                print "Opening TI-TXT File: ", file_name
+            file = open(file_name, 'rb')
+            try:
+                return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            finally:
+                file.close()
+        except (IOError, ValueError, mmap.error):
+            if(self.verbose_mode == True):
+                print "Error in opening TI-TXT file ", file_name
+            return None
+
+    #---------------------------------------------------------------------------
+    # find the sections in the buffer by scanning for '@' and 'q' markers.
+    # Returns list of (start address, start offset, end offset) of the data
+    # bytes of each section, or None in case of error
+    #---------------------------------------------------------------------------
+    def find_sections(self, buf):
+        sections = []
+
+        # there must be no data before the first start address
+        pos = buf.find('@')
+        if(pos == -1):
+            pos = len(buf)
+        if(buf[:pos].strip() not in ('', 'q')):
+            if(self.verbose_mode == True):
+                print "Error: data found before any start address"
+            return None
+
+        while(pos < len(buf)):
+            # get start address
+            eol = buf.find('\n', pos)
+            if(eol == -1):
+                eol = len(buf)
+            try:
+                start_addr = int(buf[pos+1:eol], 16)
+            except ValueError:
+                if(self.verbose_mode == True):
+                    print "Error while parsing: ", buf[pos:eol]
+                return None
+            if(self.verbose_mode == True):
+                print "Parsing data starting from address",
+                print hex(start_addr), "(", start_addr, ")"
+
+            # the data bytes end at the next section or the end of file
+            pos = buf.find('@', eol)
+            if(pos == -1):
+                pos = len(buf)
+            end = buf.find('q', eol, pos)
+            if(end == -1):
+                end = pos
+            sections.append((start_addr, eol, end))
+
+        return sections
+
+    #---------------------------------------------------------------------------
+    # parse the TI-TXT file with memory mapping. The file is scanned for '@'
+    # and 'q' markers, each section is decoded at once without splitting it
+    # into lines. With lazy=True the sections are only decoded when they are
+    # accessed, so errors in the data bytes raise ValueError at that time.
+    #---------------------------------------------------------------------------
+    def parse_mmap(self, file_name, lazy=True):
+        if(self.verbose_mode == True):
+            print "\n== Parsing TI-TXT File (mmap):", file_name, " =="
+
+        # try to open and map input file
+        buf = self.map_file(file_name)
+        if(buf == None):
+            return {}
+
+        # find all sections
+        sections = self.find_sections(buf)
+        if(sections == None):
+            return {}
+
+        # decode the data bytes
+        content = TiTxtImage()
+        for (start_addr, start, end) in sections:
+            if(lazy == True):
+                content.set_lazy_segment(start_addr,
+                    functools.partial(self.decode_span, buf, start, end))
+            else:
+                try:
+                    content[start_addr] = self.decode_span(buf, start, end)
+                except ValueError:
+                    return {}
+
+        # return content as dictionary
+        return content
+
+    #---------------------------------------------------------------------------
+    # get the process pool of parse_parallel() with jobs processes (default:
+    # number of CPUs). The pool is kept for the next calls until close_pool()
+    #---------------------------------------------------------------------------
+    def get_pool(self, jobs=None):
+        if(jobs == None):
+            jobs = multiprocessing.cpu_count()
+        if((self.pool != None) and (self.pool_jobs != jobs)):
+            self.close_pool()
+        if(self.pool == None):
+            self.pool = multiprocessing.Pool(jobs)
+            self.pool_jobs = jobs
+        return self.pool
+
+    #---------------------------------------------------------------------------
+    # terminate the process pool of parse_parallel()
+    #---------------------------------------------------------------------------
+    def close_pool(self):
+        if(self.pool != None):
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            self.pool_jobs = None
 
     #---------------------------------------------------------------------------
-    # parse the TI-TXT file
+    # parse the TI-TXT file in parallel. The sections are split into chunks of
+    # about PARALLEL_CHUNK_SIZE bytes at line boundaries, which are decoded by
+    # a process pool and merged in the file order again. The pool is given by
+    # the caller, or else created once with jobs processes (see get_pool()).
+    # The result is the same as of parse() (including parse cache and
+    # checksums), files smaller than PARALLEL_MIN_FILE_SIZE or with a single
+    # chunk are parsed with parse().
     #---------------------------------------------------------------------------
-    def parse(self,file_name):
+    def parse_parallel(self, file_name, jobs=None, pool=None):
+        # small files are parsed faster serially
+        try:
+            if(os.path.getsize(file_name) < PARALLEL_MIN_FILE_SIZE):
+                return self.parse(file_name)
+        except (OSError, TypeError):
+            return self.parse(file_name)
+
         if(self.verbose_mode == True):
-            print "\n== Parsing TI-TXT File:", file_name, " =="
+            print "\n== Parsing TI-TXT File (parallel):", file_name, " =="
 
-        # try to open input file
-        try:
-            if(self.verbose_mode == True):
-                print "Opening TI-TXT File: ", file_name
-            file = open(file_name, 'r')
-        except:
-            if(self.verbose_mode == True):
-                print "Error in opening TI-TXT file ", file_name
+        # check the parse cache first
+        if(self.cache != None):
+            content = self.cache.load(file_name, TiTxtImage)
+            if(content != None):
+                return content
+
+        # try to open and map input file, and find all sections
+        buf = self.map_file(file_name)
+        if(buf == None):
+            return {}
+        sections = self.find_sections(buf)
+        if(sections == None):
+            buf.close()
             return {}
 
-        # start parsing
-        content = {}
-        for line in file:
-            # check if this is a start address line
-            if(line.find('@') != -1):
-                try:
-                    # add new entry in dictinary
-                    addr_num = line.lstrip('@')
-                    start_addr = int(addr_num,16)
-                    content[start_addr] = []
-                    if(self.verbose_mode == True):
-                        print "Parsing data starting from address",
-                        print hex(start_addr), "(", start_addr, ")"
-                except:
-                    if(self.verbose_mode == True):
-                        print "Error while parsing: ", line
-                    file.close()
-                    return {}
+        # split the sections into chunks
+        tasks = []
+        owners = []
+        for idx in range(len(sections)):
+            (start_addr, start, end) = sections[idx]
+            while(start < end):
+                stop = min(start + PARALLEL_CHUNK_SIZE, end)
+                if(stop < end):
+                    eol = buf.find('\n', stop, end)
+                    if(eol == -1):
+                        stop = end
+                    else:
+                        stop = eol
+                tasks.append((file_name, start, stop, self.verbose_mode))
+                owners.append(idx)
+                start = stop
+        buf.close()
 
-            # check if this is not end line
-            elif(line != 'q\n'):
-                # split the strings into array of byte strings
-                byte_line = line.split(' ')
-                for byte_str in byte_line:
-                    try:
-                        if(byte_str != '\n'):
-                            # convert byte string to integer value
-                            byte_int = int(byte_str, 16)
-                            # append in the array
-                            content[start_addr].append(byte_int)
-                    except:
-                        if(self.verbose_mode == True):
-                            print "Error while trying to convert: ", byte_str
-                        file.close()
-                        return {}
+        # decode the chunks, use process pool only if it is worth it
+        if(len(tasks) < 2):
+            return self.parse(file_name)
+        if(self.verbose_mode == True):
+            print "Decoding", len(tasks), "chunks in parallel"
+        if(pool == None):
+            pool = self.get_pool(jobs)
+        results = pool.map(decode_file_span, tasks)
 
-        # close file
-        file.close()
+        # merge the decoded chunks
+        data_list = [bytearray() for section in sections]
+        for (idx, data) in zip(owners, results):
+            if(data == None):
+                return {}
+            data_list[idx].extend(data)
+        content = TiTxtImage()
+        for idx in range(len(sections)):
+            content[sections[idx][0]] = data_list[idx]
+
+        # memoize the checksums and save in the parse cache like parse()
+        for addr in content.sorted_addrs():
+            for algorithm in self.checksum_algorithms:
+                content.get_segment_checksum(addr, algorithm)
+        if(self.cache != None):
+            self.cache.store(file_name, content)
 
         # return content as dictionary
         return content
@@ -211,18 +1216,20 @@ class TiTxtParser:
             print "\n== Filling memory range =="
 
         # initialize variable
-        full_content = {}
+        full_content = TiTxtImage()
 
         # check for starting and ending address
         if(start_addr > self.get_start_addr(content)):
             if(self.verbose_mode == True):
                 print "Invalid Start Address: ", hex(start_addr),
-                print " - TI-TXT content start address: ", self.get_start_addr()
+                print " - TI-TXT content start address: ",
+                print hex(self.get_start_addr(content))
             return {}
         elif(end_addr < self.get_end_addr(content)):
             if(self.verbose_mode == True):
                 print "Invalid End Address: ", hex(end_addr),
-                print " - TI-TXT content end address: ", self.get_end_addr()
+                print " - TI-TXT content end address: ",
+                print hex(self.get_end_addr(content))
             return {}
 
         # print start message
@@ -233,153 +1240,702 @@ class TiTxtParser:
 
         # now we can work - make a list of key addresses of the TI-TXT
         # original content
-        addr_keys = content.keys()
-        addr_keys.sort()
+        addr_keys = self.get_sorted_addrs(content)
 
-        # create the key for dictionary and value as array
-        full_content[start_addr] = []
+        # create padded view over the whole range, the original segments are
+        # referenced and the gaps are only described by the fill byte
+        length = max(end_addr, self.get_end_addr(content) + 1) - start_addr
+        data = TiTxtPaddedSegment(length, fill_byte)
 
         # fill the empty memory between start address and the first address
         # in the key addresses
         addr_idx = start_addr
         for addr in addr_keys:
-            if(addr_idx != addr):
-                if(self.verbose_mode == True):
-                    print "Filling empty byte(s) from address", hex(addr_idx),
-                    print "to address ", hex(addr)
-                loop = range(addr_idx, addr)
-                for i in loop:
-                    full_content[start_addr].append(fill_byte)
-                    addr_idx += 1
-
-            # append the content directly
+            if((addr_idx < addr) and (self.verbose_mode == True)):
+                print "Filling empty byte(s) from address", hex(addr_idx),
+                print "to address ", hex(addr)
+
+            # add the content directly
             if(self.verbose_mode == True):
                 print "Copying ", len(content[addr]),
                 print "bytes data from address ", hex(addr)
-            full_content[start_addr] = full_content[start_addr] + content[addr]
+            data.add_data(addr - start_addr, content[addr])
             # update start address
-            addr_idx += len(content[addr])
+            addr_idx = max(addr_idx, addr + len(content[addr]))
 
         # fill the end if necessary
-        if(addr_idx < end_addr):
-            if(self.verbose_mode == True):
-                print "Filling empty byte(s) from address", hex(addr_idx),
-                print "to address ", hex(end_addr)
-            loop = range(addr_idx, end_addr)
-            for i in loop:
-                full_content[start_addr].append(fill_byte)
-                addr_idx += 1
+        if((addr_idx < end_addr) and (self.verbose_mode == True)):
+            print "Filling empty byte(s) from address", hex(addr_idx),
+            print "to address ", hex(end_addr)
+
+        full_content[start_addr] = data
 
         # return
         return full_content
 
     #---------------------------------------------------------------------------
-    # join two TI-TXT file contents
+    # get list of (start address, end address + 1) intervals of the segments in
+    # TI-TXT file content, sorted by start address
+    #---------------------------------------------------------------------------
+    def get_intervals(self, content):
+        intervals = []
+        for addr in self.get_sorted_addrs(content):
+            length = len(content[addr])
+            if(length != 0):
+                intervals.append((addr, addr + length))
+        return intervals
+
+    #---------------------------------------------------------------------------
+    # find overlapping addresses of two TI-TXT file contents by sweeping over
+    # the sorted segments, returns list of (start address, end address)
+    # ranges (inclusive)
+    #---------------------------------------------------------------------------
+    def find_overlaps(self, content1, content2):
+        intervals1 = self.get_intervals(content1)
+        intervals2 = self.get_intervals(content2)
+        overlaps = []
+        i = 0
+        j = 0
+        while((i < len(intervals1)) and (j < len(intervals2))):
+            (start1, end1) = intervals1[i]
+            (start2, end2) = intervals2[j]
+            start = max(start1, start2)
+            end = min(end1, end2)
+            if(start < end):
+                overlaps.append((start, end - 1))
+            # continue with the interval which ends first
+            if(end1 < end2):
+                i += 1
+            else:
+                j += 1
+        return overlaps
+
+    #---------------------------------------------------------------------------
+    # join two TI-TXT file contents, the input contents are not modified
     #---------------------------------------------------------------------------
     def join(self, content1, content2):
         if(self.verbose_mode == True):
             print "\n== Joining two TI-TXT contents =="
-        # get list of address of both contents
-        list1 = self.get_addr_list(content1)
-        list2 = self.get_addr_list(content2)
         #check if there are overlapping address
-        overlap = False
-        for addr in list1:
-            try:
-                overlap_addr = list2.index(addr)
-                overlap = True
-                if(self.verbose_mode == True):
-                    print "Overlapping address:", hex(addr)
-            except:
-                pass
+        overlaps = self.find_overlaps(content1, content2)
+        if(self.verbose_mode == True):
+            for (start_addr, end_addr) in overlaps:
+                print "Overlapping address:", hex(start_addr), "-",
+                print hex(end_addr)
 
         # abort if overlapping address found
-        if(overlap == True):
+        if(overlaps != []):
             return {}
 
-        # append content2 to content1
+        # merge copies of the content1 and content2 segments into new content,
+        # so changing the result doesn't change the input contents
         if(self.verbose_mode == True):
             print "No overlapping address found, appending contents"
-        res_content = content1
-        for addr in content2.keys():
-            res_content[addr] = content2[addr]
+        res_content = TiTxtImage()
+        for content in [content1, content2]:
+            for addr in content.keys():
+                res_content[addr] = bytearray(content[addr])
 
-        # append content2 to content 1
         return (res_content)
 
 
     #---------------------------------------------------------------------------
-    # print content into TI-TXT file format
+    # find overlapping addresses between contents with the same priority by
+    # sweeping over their merged sorted segments, returns list of (start
+    # address, end address) ranges (inclusive)
+    #---------------------------------------------------------------------------
+    def find_priority_conflicts(self, contents, priorities):
+        overlaps = []
+        for priority in sorted(set(priorities)):
+            # merge the sorted intervals of all contents with this priority
+            intervals = heapq.merge(*[self.get_intervals(contents[idx])
+                for idx in range(len(contents))
+                if (priorities[idx] == priority)])
+            max_end = None
+            for (start, end) in intervals:
+                if((max_end != None) and (start < max_end)):
+                    overlaps.append((start, min(end, max_end) - 1))
+                if((max_end == None) or (end > max_end)):
+                    max_end = end
+        return overlaps
+
+    #---------------------------------------------------------------------------
+    # merge any number of TI-TXT file contents in one pass over the sorted
+    # segments. Overlapping bytes are taken from the content with the higher
+    # priority (default: all 0), overlapping contents with the same priority
+    # are not allowed. Data which is split by an overlapping content is
+    # merged into one segment, otherwise the segments are kept as they are.
+    #---------------------------------------------------------------------------
+    def merge(self, contents, priorities=None):
+        if(self.verbose_mode == True):
+            print "\n== Merging", len(contents), "TI-TXT contents =="
+        if(priorities == None):
+            priorities = [0] * len(contents)
+
+        # check overlapping addresses with the same priority
+        overlaps = self.find_priority_conflicts(contents, priorities)
+        if(overlaps != []):
+            if(self.verbose_mode == True):
+                for (start_addr, end_addr) in overlaps:
+                    print "Overlapping address with same priority:",
+                    print hex(start_addr), "-", hex(end_addr)
+            return {}
+
+        # sorted stream of (start, end, input idx) of all segments
+        pending = heapq.merge(*[[(start, end, idx) for (start, end) in
+            self.get_intervals(contents[idx])]
+            for idx in range(len(contents))])
+
+        # heap of active segments: (-priority, input idx, end, start)
+        active = []
+        res_content = TiTxtImage()
+        out_data = None
+        out_end = None
+        out_src = None
+        seg = next(pending, None)
+        pos = None
+        while((seg != None) or (active != [])):
+            # jump over address gaps
+            if(active == []):
+                pos = seg[0]
+            # activate all segments starting at current address
+            while((seg != None) and (seg[0] <= pos)):
+                (start, end, idx) = seg
+                heapq.heappush(active, (-priorities[idx], idx, end, start))
+                seg = next(pending, None)
+            # remove ended segments
+            while((active != []) and (active[0][2] <= pos)):
+                heapq.heappop(active)
+            if(active == []):
+                continue
+
+            # the segment with the highest priority is valid until it ends or
+            # until the next segment starts
+            (prio, idx, end, start) = active[0]
+            stop = end
+            if((seg != None) and (seg[0] < stop)):
+                stop = seg[0]
+            data = contents[idx][start][(pos - start):(stop - start)]
+
+            # append to the current output segment if it is the same input
+            # segment, or if the address boundary is caused by overlapping
+            src = (idx, start, end)
+            if((out_data != None) and (out_end == pos) and ((src == out_src) or
+                    (start < pos) or (out_src[2] > pos))):
+                out_data.extend(data)
+            else:
+                if(self.verbose_mode == True):
+                    print "Merging data starting from address", hex(pos)
+                out_data = bytearray(data)
+                res_content[pos] = out_data
+            out_end = stop
+            out_src = src
+            pos = stop
+
+        return res_content
+
+    #---------------------------------------------------------------------------
+    # parse manifest file for merge(): each line contains a TI-TXT file name
+    # and an optional priority, empty lines and lines starting with '#' are
+    # ignored. Returns list of (file name, priority), or None in case of error
+    #---------------------------------------------------------------------------
+    def parse_manifest(self, manifest_name):
+        entries = []
+        try:
+            file = open(manifest_name, 'r')
+        except IOError:
+            if(self.verbose_mode == True):
+                print "Error in opening manifest file ", manifest_name
+            return None
+        try:
+            for line in file:
+                fields = line.split()
+                if((fields == []) or fields[0].startswith('#')):
+                    continue
+                if(len(fields) == 1):
+                    entries.append((fields[0], 0))
+                elif(len(fields) == 2):
+                    entries.append((fields[0], int(fields[1], 0)))
+                else:
+                    raise ValueError("invalid manifest line")
+        except ValueError:
+            if(self.verbose_mode == True):
+                print "Error while parsing manifest: ", line
+            return None
+        finally:
+            file.close()
+        return entries
+
+    #---------------------------------------------------------------------------
+    # format data bytes into TI-TXT data lines (16 bytes per line). The data is
+    # converted with a single hexlify() call, and the hex digits are scattered
+    # into the line layout with extended slice assignments, one per column.
+    #---------------------------------------------------------------------------
+    def format_data(self, data, upper_case=False):
+        (num_of_lines, rest) = divmod(len(data), BYTES_PER_LINE)
+        hex_str = binascii.hexlify(data)
+        if(upper_case == True):
+            hex_str = hex_str.upper()
+
+        # full lines: "xx xx ... xx \n" - 3 characters per byte + new line
+        line_len = (3 * BYTES_PER_LINE) + 1
+        text = bytearray(" ") * (line_len * num_of_lines)
+        for col in range(BYTES_PER_LINE):
+            text[(3 * col)::line_len] = \
+                hex_str[(2 * col):(2 * BYTES_PER_LINE * num_of_lines):
+                    (2 * BYTES_PER_LINE)]
+            text[(3 * col + 1)::line_len] = \
+                hex_str[(2 * col + 1):(2 * BYTES_PER_LINE * num_of_lines):
+                    (2 * BYTES_PER_LINE)]
+        text[(line_len - 1)::line_len] = "\n" * num_of_lines
+
+        # last incomplete line
+        if(rest != 0):
+            last = hex_str[(2 * BYTES_PER_LINE * num_of_lines):]
+            for idx in range(0, len(last), 2):
+                text += last[idx:(idx + 2)] + " "
+            text += "\n"
+
+        return str(text)
+
+    #---------------------------------------------------------------------------
+    # format start address line
+    #---------------------------------------------------------------------------
+    def format_addr(self, addr, upper_case=False):
+        if(upper_case == True):
+            return "@%X\n" % addr
+        return "@%x\n" % addr
+
+    #---------------------------------------------------------------------------
+    # print content into TI-TXT file format, with lower case (default) or
+    # upper case hex digits
     #---------------------------------------------------------------------------
-    def print_ti_txt(self, file_name, content):
+    def print_ti_txt(self, file_name, content, upper_case=False):
         if(self.verbose_mode == True):
             print "\n== Print out TI-TXT file:", file_name, "=="
 
-        # check for content data type (must be dictionary):
-        if(type(content) != dict):
+        # check for content data type (must be dictionary or TiTxtImage):
+        if(not isinstance(content, dict)):
             if(self.verbose_mode == True):
                 print "Invalid input content data type:", type(content)
             return False
 
         # try to open file
-        try:
-            if(self.verbose_mode == True):
-                print "Opening file in write mode"
-            file = open(file_name, 'w')
-        except:
-            if(self.verbose_mode == True):
-                print "Failed to open file in write mode"
+        writer = TiTxtWriter(file_name, upper_case, self.verbose_mode)
+        if(writer.open() != True):
             return False
 
         # sort the content address
-        addr_sorted = content.keys()
-        addr_sorted.sort()
+        addr_sorted = self.get_sorted_addrs(content)
 
         # start writing file
         for addr in addr_sorted:
             # write starting address
-            if(self.verbose_mode == True):
-                print "Writing memory starting from address ", hex(addr)
-            line = "@" + hex(addr).lstrip("0x") + "\n"
-            file.write(line);
-
-            # write bytes, maximum 16 bytes per line
-            idx = 0
-            line = ""
-            for byte in content[addr]:
-                line += "%02x" % byte + " "
-                idx += 1
-                if(idx == 16):
-                    # write line to file
-                    line += "\n"
-                    file.write(line)
-                    # prepare new line
-                    line = ""
-                    idx = 0
-
-            # flush data
-            if(idx != 0):
-                line += "\n"
-                file.write(line)
-
-        #print end of file
-        file.write("q\n")
-
-        #close file
-        file.close()
+            writer.write_segment(addr, bytearray())
+
+            # write bytes in blocks (segments may also be lists of integers)
+            data = content[addr]
+            if(not isinstance(data, (bytearray, TiTxtPaddedSegment))):
+                data = bytearray(data)
+            for idx in xrange(0, len(data), WRITE_BLOCK_SIZE):
+                writer.write_segment(addr + idx,
+                    data[idx:(idx + WRITE_BLOCK_SIZE)])
+
+        #print end of file and close file
+        writer.close()
         if(self.verbose_mode == True):
             print "Finished writing TI-TXT file"
         return True
 
 
+    #---------------------------------------------------------------------------
+    # get file format from the given format name or from the file name
+    # extension, returns None for unknown format name
+    #---------------------------------------------------------------------------
+    def get_file_format(self, file_name, file_format=None):
+        if(file_format != None):
+            if(file_format in FILE_FORMATS):
+                return file_format
+            if(self.verbose_mode == True):
+                print "Unknown file format:", file_format
+            return None
+        if(isinstance(file_name, str)):
+            ext = os.path.splitext(file_name)[1].lower()
+            return FILE_EXTENSIONS.get(ext, FORMAT_TI_TXT)
+        return FORMAT_TI_TXT
+
+    #---------------------------------------------------------------------------
+    # open input or output file (name, '-' for stdin/stdout, or file object)
+    #---------------------------------------------------------------------------
+    def open_file(self, file_or_path, mode):
+        if(hasattr(file_or_path, 'read') or hasattr(file_or_path, 'write')):
+            return file_or_path
+        if(file_or_path == '-'):
+            if(mode[0] == 'r'):
+                return sys.stdin
+            return sys.stdout
+        return open(file_or_path, mode, WRITE_BUFFER_SIZE)
+
+    #---------------------------------------------------------------------------
+    # close file opened with open_file()
+    #---------------------------------------------------------------------------
+    def close_file(self, file, file_or_path):
+        if((file is not file_or_path) and (file is not sys.stdin) and
+                (file is not sys.stdout)):
+            file.close()
+        elif(hasattr(file, 'flush')):
+            file.flush()
+
+    #---------------------------------------------------------------------------
+    # build content from (address, data) records, contiguous records are
+    # merged into one segment
+    #---------------------------------------------------------------------------
+    def build_image(self, records):
+        content = TiTxtImage()
+        next_addr = None
+        for (addr, data) in records:
+            if(len(data) == 0):
+                continue
+            if(addr != next_addr):
+                if(content.find_segment(addr) != None):
+                    if(self.verbose_mode == True):
+                        print "Overlapping address:", hex(addr)
+                    raise ValueError("overlapping address")
+                content[addr] = bytearray()
+                segment = content[addr]
+            segment.extend(data)
+            next_addr = addr + len(data)
+        return content
+
+    #---------------------------------------------------------------------------
+    # decode the hex digits of a record line following the header_len
+    # characters long record header into bytearray, raises ValueError in case
+    # of error
+    #---------------------------------------------------------------------------
+    def decode_hex_record(self, line, start_char, header_len):
+        line = line.strip()
+        try:
+            if(line[0] != start_char):
+                raise ValueError("invalid record start")
+            record = bytearray(binascii.unhexlify(line[header_len:]))
+        except (ValueError, TypeError, IndexError):
+            if(self.verbose_mode == True):
+                print "Error while parsing: ", line
+            raise ValueError("invalid record")
+        return record
+
+    #---------------------------------------------------------------------------
+    # iterate over the data records of an Intel HEX file. Yields (address,
+    # data) tuples in the file order, raises ValueError in case of error
+    #---------------------------------------------------------------------------
+    def iter_ihex_records(self, file):
+        # number of data bytes of the other record types than data record
+        data_lens = {0x01: 0, 0x02: 2, 0x03: 4, 0x04: 2, 0x05: 4}
+        base_addr = 0
+        for line in file:
+            if(line.strip() == ""):
+                continue
+            record = self.decode_hex_record(line, ':', 1)
+            # check record length, checksum and data length of record type
+            if((len(record) < 5) or (len(record) != record[0] + 5) or
+                    ((sum(record) & 0xFF) != 0) or ((record[3] in data_lens)
+                    and (record[0] != data_lens[record[3]]))):
+                if(self.verbose_mode == True):
+                    print "Invalid Intel HEX record: ", line
+                raise ValueError("invalid Intel HEX record")
+            rec_type = record[3]
+            if(rec_type == 0x00):
+                # data record
+                addr = base_addr + ((record[1] << 8) | record[2])
+                yield (addr, record[4:-1])
+            elif(rec_type == 0x01):
+                # end of file record
+                break
+            elif(rec_type == 0x02):
+                # extended segment address record
+                base_addr = ((record[4] << 8) | record[5]) << 4
+            elif(rec_type == 0x04):
+                # extended linear address record
+                base_addr = ((record[4] << 8) | record[5]) << 16
+
+    #---------------------------------------------------------------------------
+    # iterate over the data records of a Motorola S-record file. Yields
+    # (address, data) tuples in the file order, raises ValueError in case of
+    # error
+    #---------------------------------------------------------------------------
+    def iter_srec_records(self, file):
+        # number of address bytes of S1, S2 and S3 data records
+        addr_lens = {'1': 2, '2': 3, '3': 4}
+        for line in file:
+            if(line.strip() == ""):
+                continue
+            record = self.decode_hex_record(line, 'S', 2)
+            # check record length and checksum
+            if((len(record) < 3) or (len(record) != record[0] + 1) or
+                    ((sum(record) & 0xFF) != 0xFF)):
+                if(self.verbose_mode == True):
+                    print "Invalid S-record: ", line
+                raise ValueError("invalid S-record")
+            rec_type = line.strip()[1]
+            if(rec_type in addr_lens):
+                addr_len = addr_lens[rec_type]
+                if(len(record) < addr_len + 2):
+                    if(self.verbose_mode == True):
+                        print "Invalid S-record: ", line
+                    raise ValueError("invalid S-record")
+                addr = 0
+                for byte in record[1:(1 + addr_len)]:
+                    addr = (addr << 8) | byte
+                yield (addr, record[(1 + addr_len):-1])
+            elif(rec_type in "789"):
+                # termination record
+                break
+
+    #---------------------------------------------------------------------------
+    # parse raw binary file which is located at address base_addr
+    #---------------------------------------------------------------------------
+    def parse_bin(self, file_name, base_addr=0):
+        if(self.verbose_mode == True):
+            print "\n== Parsing binary File:", file_name, " =="
+        try:
+            file = self.open_file(file_name, 'rb')
+            try:
+                if(isinstance(file_name, str) and (file_name != '-')):
+                    # read whole file directly into the segment buffer
+                    data = bytearray(os.fstat(file.fileno()).st_size)
+                    data = data[:file.readinto(data)]
+                else:
+                    data = bytearray(file.read())
+            finally:
+                self.close_file(file, file_name)
+        except IOError:
+            if(self.verbose_mode == True):
+                print "Error in opening binary file ", file_name
+            return {}
+        if(len(data) == 0):
+            return {}
+        return TiTxtImage({base_addr: data})
+
+    #---------------------------------------------------------------------------
+    # parse Intel HEX (file_format FORMAT_IHEX) or Motorola S-record
+    # (FORMAT_SREC) file
+    #---------------------------------------------------------------------------
+    def parse_hex(self, file_name, file_format):
+        if(self.verbose_mode == True):
+            print "\n== Parsing", file_format, "File:", file_name, " =="
+        try:
+            file = self.open_file(file_name, 'r')
+            try:
+                if(file_format == FORMAT_IHEX):
+                    return self.build_image(self.iter_ihex_records(file))
+                return self.build_image(self.iter_srec_records(file))
+            finally:
+                self.close_file(file, file_name)
+        except IOError:
+            if(self.verbose_mode == True):
+                print "Error in opening file ", file_name
+            return {}
+        except ValueError:
+            return {}
+
+    #---------------------------------------------------------------------------
+    # parse file in the given format (default: detected from file name
+    # extension). base_addr is the start address of raw binary files
+    #---------------------------------------------------------------------------
+    def parse_file(self, file_name, file_format=None, base_addr=0):
+        file_format = self.get_file_format(file_name, file_format)
+        if(file_format == FORMAT_BIN):
+            return self.parse_bin(file_name, base_addr)
+        elif((file_format == FORMAT_IHEX) or (file_format == FORMAT_SREC)):
+            return self.parse_hex(file_name, file_format)
+        elif(file_format == FORMAT_TI_TXT):
+            return self.parse(file_name)
+        return {}
+
+    #---------------------------------------------------------------------------
+    # print content into raw binary file, starting from the start address of
+    # the content. Gaps between the segments are filled with fill_byte
+    #---------------------------------------------------------------------------
+    def print_bin(self, file_name, content, fill_byte=0xFF):
+        if(self.verbose_mode == True):
+            print "\n== Print out binary file:", file_name, "=="
+
+        # check for content data type (must be dictionary or TiTxtImage):
+        if(not isinstance(content, dict)):
+            if(self.verbose_mode == True):
+                print "Invalid input content data type:", type(content)
+            return False
+
+        try:
+            file = self.open_file(file_name, 'wb')
+        except IOError:
+            if(self.verbose_mode == True):
+                print "Failed to open file in write mode"
+            return False
+
+        fill_block = chr(fill_byte) * FILL_CHUNK_SIZE
+        next_addr = None
+        for addr in self.get_sorted_addrs(content):
+            # fill the gap to the previous segment
+            if(next_addr != None):
+                if(addr < next_addr):
+                    if(self.verbose_mode == True):
+                        print "Overlapping address:", hex(addr)
+                    self.close_file(file, file_name)
+                    return False
+                gap = addr - next_addr
+                while(gap > 0):
+                    file.write(fill_block[:gap])
+                    gap -= FILL_CHUNK_SIZE
+
+            # write segment data directly from the segment buffer (segments
+            # may also be lists of integers)
+            data = content[addr]
+            if(not isinstance(data, (bytearray, TiTxtPaddedSegment))):
+                data = bytearray(data)
+            if(hasattr(data, 'iter_chunks')):
+                for chunk in data.iter_chunks():
+                    file.write(chunk)
+            else:
+                file.write(buffer(data))
+            next_addr = addr + len(data)
+
+        self.close_file(file, file_name)
+        return True
+
+    #---------------------------------------------------------------------------
+    # format a hex record line from the record bytes and checksum
+    #---------------------------------------------------------------------------
+    def format_hex_record(self, prefix, record, checksum):
+        record.append(checksum)
+        return prefix + binascii.hexlify(record).upper() + "\n"
+
+    #---------------------------------------------------------------------------
+    # format data starting at address addr into Intel HEX records. base_addr
+    # is the address of the last extended linear address record, returns
+    # (text, new base_addr)
+    #---------------------------------------------------------------------------
+    def format_ihex_data(self, addr, data, base_addr):
+        lines = []
+        idx = 0
+        while(idx < len(data)):
+            cur_addr = addr + idx
+            # new extended linear address record for every 64KB block
+            if((cur_addr & ~0xFFFF) != base_addr):
+                base_addr = cur_addr & ~0xFFFF
+                record = bytearray([2, 0, 0, 4, (base_addr >> 24) & 0xFF,
+                    (base_addr >> 16) & 0xFF])
+                lines.append(self.format_hex_record(":", record,
+                    (-sum(record)) & 0xFF))
+            # data records must not cross the 64KB block boundary
+            data_len = min(RECORD_DATA_LEN, len(data) - idx,
+                0x10000 - (cur_addr & 0xFFFF))
+            record = bytearray([data_len, (cur_addr >> 8) & 0xFF,
+                cur_addr & 0xFF, 0]) + data[idx:(idx + data_len)]
+            lines.append(self.format_hex_record(":", record,
+                (-sum(record)) & 0xFF))
+            idx += data_len
+        return ("".join(lines), base_addr)
+
+    #---------------------------------------------------------------------------
+    # format data starting at address addr into S-records with addr_len
+    # address bytes (2: S1, 3: S2, 4: S3)
+    #---------------------------------------------------------------------------
+    def format_srec_data(self, addr, data, addr_len):
+        prefix = "S%d" % (addr_len - 1)
+        lines = []
+        for idx in xrange(0, len(data), RECORD_DATA_LEN):
+            cur_addr = addr + idx
+            chunk = data[idx:(idx + RECORD_DATA_LEN)]
+            record = bytearray([len(chunk) + addr_len + 1])
+            for shift in range(8 * (addr_len - 1), -8, -8):
+                record.append((cur_addr >> shift) & 0xFF)
+            record += chunk
+            lines.append(self.format_hex_record(prefix, record,
+                0xFF - (sum(record) & 0xFF)))
+        return "".join(lines)
+
+    #---------------------------------------------------------------------------
+    # print content into Intel HEX (file_format FORMAT_IHEX) or Motorola
+    # S-record (FORMAT_SREC) file
+    #---------------------------------------------------------------------------
+    def print_hex(self, file_name, content, file_format):
+        if(self.verbose_mode == True):
+            print "\n== Print out", file_format, "file:", file_name, "=="
+
+        # check for content data type (must be dictionary or TiTxtImage):
+        if(not isinstance(content, dict)):
+            if(self.verbose_mode == True):
+                print "Invalid input content data type:", type(content)
+            return False
+
+        try:
+            file = self.open_file(file_name, 'w')
+        except IOError:
+            if(self.verbose_mode == True):
+                print "Failed to open file in write mode"
+            return False
+
+        # S-record type is selected by the end address
+        end_addr = self.get_end_addr(content)
+        if(end_addr <= 0xFFFF):
+            addr_len = 2
+        elif(end_addr <= 0xFFFFFF):
+            addr_len = 3
+        else:
+            addr_len = 4
+        if(file_format == FORMAT_SREC):
+            # empty header record
+            file.write("S0030000FC\n")
+
+        base_addr = 0
+        for addr in self.get_sorted_addrs(content):
+            # write segment in blocks (segments may also be lists of integers)
+            data = content[addr]
+            if(not isinstance(data, (bytearray, TiTxtPaddedSegment))):
+                data = bytearray(data)
+            for idx in xrange(0, len(data), WRITE_BLOCK_SIZE):
+                block = data[idx:(idx + WRITE_BLOCK_SIZE)]
+                if(file_format == FORMAT_IHEX):
+                    (text, base_addr) = self.format_ihex_data(addr + idx,
+                        block, base_addr)
+                else:
+                    text = self.format_srec_data(addr + idx, block, addr_len)
+                file.write(text)
+
+        # write end of file / termination record
+        if(file_format == FORMAT_IHEX):
+            file.write(":00000001FF\n")
+        else:
+            record = bytearray([addr_len + 1]) + bytearray(addr_len)
+            file.write(self.format_hex_record("S%d" % (11 - addr_len),
+                record, 0xFF - (sum(record) & 0xFF)))
+
+        self.close_file(file, file_name)
+        return True
+
+    #---------------------------------------------------------------------------
+    # print content into file in the given format (default: detected from file
+    # name extension). fill_byte is used for the gaps in raw binary files
+    #---------------------------------------------------------------------------
+    def print_file(self, file_name, content, file_format=None,
+            upper_case=False, fill_byte=0xFF):
+        file_format = self.get_file_format(file_name, file_format)
+        if(file_format == FORMAT_BIN):
+            return self.print_bin(file_name, content, fill_byte)
+        elif((file_format == FORMAT_IHEX) or (file_format == FORMAT_SREC)):
+            return self.print_hex(file_name, content, file_format)
+        elif(file_format == FORMAT_TI_TXT):
+            return self.print_ti_txt(file_name, content, upper_case)
+        return False
+
     #---------------------------------------------------------------------------
     # Debug print TI-TXT file content
     #---------------------------------------------------------------------------
     def debug_print_content(self, content):
         try:
             print "\n== Print out TI-TXT content =="
-            start_addresses = content.keys()
-            start_addresses.sort()
+            start_addresses = self.get_sorted_addrs(content)
             for start_addr in start_addresses:
                 # calculate end address
                 end_addr = start_addr + len(content[start_addr]) - 1
@@ -403,6 +1959,194 @@ class TiTxtParser:
         except:
             print "Error in printing full filled content"
 
+#===============================================================================
+# TI-TXT writer class - writes TI-TXT file incrementally
+#===============================================================================
+class TiTxtWriter:
+    #---------------------------------------------------------------------------
+    # Usage: open(), write_segment(addr, data) repeatedly, close(). Data which
+    # continues at the end address of the previous data is appended to the
+    # same section, otherwise (or if data is empty) a new section is started,
+    # so the (address, data) records of TiTxtParser.iter_records() can be
+    # written directly. Only an incomplete line (< 16 bytes) is kept in memory.
+    #---------------------------------------------------------------------------
+    # output file name ('-' for stdout) or file object
+    file_or_path = None
+    # output file handle
+    file = None
+    # flag for upper case hex digits
+    upper_case = False
+    # flag for verbose mode
+    verbose_mode = False
+
+    #---------------------------------------------------------------------------
+    # init function - instantiation operation
+    #---------------------------------------------------------------------------
+    def __init__(self, file_or_path, upper_case=False, verbose=False):
+        self.file_or_path = file_or_path
+        self.upper_case = upper_case
+        self.verbose_mode = verbose
+        self.parser = TiTxtParser(False)
+        # address of the next byte in current section
+        self.next_addr = None
+        # bytes of the incomplete last line
+        self.pending = bytearray()
+
+    #---------------------------------------------------------------------------
+    # open output file, returns False if failed
+    #---------------------------------------------------------------------------
+    def open(self):
+        if(hasattr(self.file_or_path, 'write')):
+            self.file = self.file_or_path
+        elif(self.file_or_path == '-'):
+            self.file = sys.stdout
+        else:
+            try:
+                if(self.verbose_mode == True):
+                    print "Opening file in write mode"
+                self.file = open(self.file_or_path, 'w', WRITE_BUFFER_SIZE)
+            except IOError:
+                if(self.verbose_mode == True):
+                    print "Failed to open file in write mode"
+                return False
+        self.next_addr = None
+        self.pending = bytearray()
+        return True
+
+    #---------------------------------------------------------------------------
+    # write the incomplete last line
+    #---------------------------------------------------------------------------
+    def flush_line(self):
+        if(len(self.pending) != 0):
+            self.file.write(self.parser.format_data(self.pending,
+                self.upper_case))
+            self.pending = bytearray()
+
+    #---------------------------------------------------------------------------
+    # write data (bytearray, string or list of integers) starting at address
+    # addr
+    #---------------------------------------------------------------------------
+    def write_segment(self, addr, data):
+        if(not isinstance(data, (bytearray, TiTxtPaddedSegment))):
+            data = bytearray(data)
+
+        # start new section if necessary
+        if((len(data) == 0) or (addr != self.next_addr)):
+            self.flush_line()
+            if(self.verbose_mode == True):
+                print "Writing memory starting from address ", hex(addr)
+            self.file.write(self.parser.format_addr(addr, self.upper_case))
+
+        # write complete lines, keep the incomplete last line
+        for idx in xrange(0, len(data), WRITE_BLOCK_SIZE):
+            block = data[idx:(idx + WRITE_BLOCK_SIZE)]
+            if(len(self.pending) != 0):
+                block = self.pending + block
+            full_len = len(block) - (len(block) % BYTES_PER_LINE)
+            self.file.write(self.parser.format_data(block[:full_len],
+                self.upper_case))
+            self.pending = bytearray(block[full_len:])
+        self.next_addr = addr + len(data)
+
+    #---------------------------------------------------------------------------
+    # flush buffered output to the file
+    #---------------------------------------------------------------------------
+    def flush(self):
+        self.file.flush()
+
+    #---------------------------------------------------------------------------
+    # write end of file and close file (if it was opened here)
+    #---------------------------------------------------------------------------
+    def close(self):
+        self.flush_line()
+        self.file.write("q\n")
+        if((self.file is not self.file_or_path) and
+                (self.file is not sys.stdout)):
+            self.file.close()
+        else:
+            self.file.flush()
+        self.file = None
+
+#===============================================================================
+# process pool worker for TiTxtParser.parse_parallel(): decode data bytes of
+# the file between start and end offset, returns None in case of error
+#===============================================================================
+def decode_file_span(task):
+    (file_name, start, end, verbose) = task
+    file = open(file_name, 'rb')
+    try:
+        file.seek(start)
+        text = file.read(end - start)
+    finally:
+        file.close()
+    data = TiTxtParser(verbose).decode_data_lines([text])
+    if(data == None):
+        return None
+    # return as string, which is faster to be sent back to the main process
+    return str(data)
+
+#===============================================================================
+# get the bytes of content as dictionary address -> byte value
+#===============================================================================
+def get_content_bytes(content):
+    content_bytes = {}
+    for addr in content:
+        for (idx, value) in enumerate(content[addr]):
+            content_bytes[addr + idx] = value
+    return content_bytes
+
+#===============================================================================
+# print content into file with the given format, parse the file back and
+# compare it with the expected bytes. Returns the parsed image or None
+#===============================================================================
+def test_print_content(ti_txt, file_name, file_format, content, expected):
+    if(ti_txt.print_file(file_name, content, file_format) != True):
+        print "ERROR: Failed to print", file_format, "file"
+        return None
+    image = ti_txt.parse_file(file_name, file_format, min(expected))
+    if(image == {}):
+        print "ERROR: Failed to parse", file_format, "file"
+        return None
+    result = get_content_bytes(image)
+    if(file_format == FORMAT_BIN):
+        # drop the filled gaps between the segments
+        for addr in result.keys():
+            if((addr not in expected) and (result[addr] == 0xFF)):
+                del result[addr]
+    if(result != expected):
+        print "ERROR: Unmatched content in", file_format, "file"
+        return None
+    return image
+
+#===============================================================================
+# test printing contents given as plain dictionaries of integer lists (as
+# used by former versions and returned by TiTxtImage.as_dict()) into all
+# file formats
+#===============================================================================
+def test_list_content(verbose_mode):
+    ti_txt = TiTxtParser(verbose_mode)
+    content = {0x1000: [0x01, 0x02, 0x03], 0x1010: range(40),
+        0xFFFE: [0x00, 0xC0]}
+    expected = get_content_bytes(content)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for file_format in [FORMAT_TI_TXT, FORMAT_BIN, FORMAT_IHEX,
+                FORMAT_SREC]:
+            file_name = os.path.join(tmp_dir, "test." + file_format)
+            print "\r\n* Printing dictionary of lists into", file_format, "file"
+            image = test_print_content(ti_txt, file_name, file_format,
+                content, expected)
+            if(image == None):
+                return False
+            print "\r\n* Printing TiTxtImage.as_dict() into", file_format, "file"
+            if(test_print_content(ti_txt, file_name, file_format,
+                    image.as_dict(), expected) == None):
+                return False
+    finally:
+        shutil.rmtree(tmp_dir)
+    print "\r\n* Test passed"
+    return True
+
 #===============================================================================
 # main script
 #===============================================================================
@@ -410,55 +2154,156 @@ if __name__ == '__main__':
     #parse the command line parameters using OptionParser
     cmd_line_parser = optparse.OptionParser()
     cmd_line_parser.add_option("-f", "--file", action="store", type="string",
-            dest="file_name", help="parse TI-TXT file with name FILE",
+            dest="file_name",
+            help="parse TI-TXT file with name FILE ('-' for stdin)",
             metavar="FILE")
+    cmd_line_parser.add_option("-F", "--format", action="store",
+            type="choice", choices=FILE_FORMATS, dest="in_format",
+            help="format of the input files: " + ", ".join(FILE_FORMATS) +
+            " (default: detected from file name extension)")
+    cmd_line_parser.add_option("-b", "--base", action="store", type="int",
+            dest="base_addr", default=0,
+            help="start address of raw binary input files with value of " +
+            "BADDR (default: 0)", metavar="BADDR")
     cmd_line_parser.add_option("-v", "--verbose", action="store_true",
             dest="verbose", help="activate verbose mode")
+    cmd_line_parser.add_option("-m", "--mmap", action="store_true",
+            dest="mmap", help="parse input files with memory mapping")
+    cmd_line_parser.add_option("--jobs", action="store", type="int",
+            dest="jobs", help="parse input files in parallel with JOBS processes",
+            metavar="JOBS")
     cmd_line_parser.add_option("-s", "--start", action="store", type="int",
             dest="start_addr", help="start address with value of SADDR",
             metavar="SADDR")
     cmd_line_parser.add_option("-e", "--end", action="store", type="int",
             dest="end_addr", help="end address with value of EADDR",
             metavar="EADDR")
-    cmd_line_parser.add_option("-j", "--join", action="store", type="string",
-            dest="join_file_name",
-            help="join main TI-TXT file with second file with name JOINFILE",
-            metavar="JOINFILE")
+    cmd_line_parser.add_option("-j", "--join", action="append", type="string",
+            dest="join_file_names",
+            help="join main TI-TXT file with file with name JOINFILE " +
+            "(can be given multiple times)", metavar="JOINFILE")
+    cmd_line_parser.add_option("-M", "--manifest", action="store",
+            type="string", dest="manifest_name",
+            help="merge TI-TXT files listed in MANIFEST file, each line " +
+            "contains a file name and an optional priority for overlapping " +
+            "addresses", metavar="MANIFEST")
     cmd_line_parser.add_option("-o", "--output", action="store", type="string",
             dest="out_file_name", help="output TI-TXT file with name OUTFILE",
             metavar="OUTFILE")
+    cmd_line_parser.add_option("-O", "--out-format", action="store",
+            type="choice", choices=FILE_FORMATS, dest="out_format",
+            help="format of the output file: " + ", ".join(FILE_FORMATS) +
+            " (default: detected from file name extension)")
+    cmd_line_parser.add_option("--stream", action="store_true",
+            dest="stream", default=False,
+            help="copy input file to output file record by record, " +
+            "without building the whole image in memory")
+    cmd_line_parser.add_option("-U", "--upper", action="store_true",
+            dest="upper_case", default=False,
+            help="write output file with upper case hex digits")
+    cmd_line_parser.add_option("-t", "--test", action="store_true",
+            dest="test", default=False,
+            help="test printing dictionaries of lists into all file formats")
+    TiTxtCache.add_cache_options(cmd_line_parser)
     (options, args) = cmd_line_parser.parse_args()
 
+    # check if it is to run test
+    if(options.test == True):
+        if(test_list_content(options.verbose) != True):
+            sys.exit(1)
+        sys.exit(0)
+
     # check given input file name parameter
-    if(options.file_name == None):
+    if((options.file_name == None) and (options.manifest_name == None)):
         print "Input TI-TXT file name is missing!"
         cmd_line_parser.print_help()
         sys.exit(1)
 
     # create new instance of TI-TXT class
-    ti_txt = TiTxtParser(options.verbose)
+    ti_txt = TiTxtParser(options.verbose,
+        TiTxtCache.get_cache(options, options.verbose))
 
-    # do the parsing
-    content = ti_txt.parse(options.file_name)
-    if(content == {}):
-        print "Failed to parse TI-TXT file:", options.file_name
-        sys.exit(1)
-    if(options.verbose == True):
-        ti_txt.debug_print_content(content)
+    # select the parse method
+    if(options.jobs != None):
+        parse = lambda file_name: ti_txt.parse_parallel(file_name, options.jobs)
+    elif(options.mmap == True):
+        parse = lambda file_name: ti_txt.parse_mmap(file_name, False)
+    else:
+        parse = ti_txt.parse
+
+    # parse other file formats with parse_file()
+    def parse_input(file_name):
+        file_format = ti_txt.get_file_format(file_name, options.in_format)
+        if(file_format != FORMAT_TI_TXT):
+            return ti_txt.parse_file(file_name, file_format, options.base_addr)
+        return parse(file_name)
+
+    # stream the records from the input to the output file
+    if(options.stream == True):
+        if((options.file_name == None) or (options.out_file_name == None)):
+            print "Streaming needs input and output TI-TXT file names!"
+            sys.exit(1)
+        if((ti_txt.get_file_format(options.file_name, options.in_format) !=
+                FORMAT_TI_TXT) or (ti_txt.get_file_format(
+                options.out_file_name, options.out_format) != FORMAT_TI_TXT)):
+            print "Streaming is only supported for TI-TXT files!"
+            sys.exit(1)
+        writer = TiTxtWriter(options.out_file_name, options.upper_case,
+            options.verbose)
+        if(writer.open() != True):
+            print "Failed to write output TI-TXT file!"
+            sys.exit(1)
+        try:
+            for (addr, data) in ti_txt.iter_records(options.file_name):
+                writer.write_segment(addr, data)
+        except (IOError, ValueError):
+            print "Failed to parse TI-TXT file:", options.file_name
+            sys.exit(1)
+        writer.close()
+        sys.exit(0)
 
-    # check if there is secondary input file to be joined
-    if(options.join_file_name != None):
-        content2 = ti_txt.parse(options.join_file_name)
+    # collect input files and their priorities
+    input_files = []
+    if(options.file_name != None):
+        input_files.append((options.file_name, 0))
+    if(options.join_file_names != None):
+        for file_name in options.join_file_names:
+            input_files.append((file_name, 0))
+    if(options.manifest_name != None):
+        entries = ti_txt.parse_manifest(options.manifest_name)
+        if(entries == None):
+            print "Failed to parse manifest file:", options.manifest_name
+            sys.exit(1)
+        input_files += entries
+
+    # do the parsing
+    contents = []
+    for (file_name, priority) in input_files:
+        content = parse_input(file_name)
+        if(content == {}):
+            print "Failed to parse TI-TXT file:", file_name
+            sys.exit(1)
         if(options.verbose == True):
-            ti_txt.debug_print_content(content2)
+            ti_txt.debug_print_content(content)
+        contents.append(content)
+    ti_txt.close_pool()
+
+    # merge the input files if necessary
+    if(len(contents) > 1):
         try:
-            content = ti_txt.join(content, content2)
+            content = ti_txt.merge(contents,
+                [priority for (file_name, priority) in input_files])
         except:
             print "Error on joining contents"
             sys.exit(1)
         if(content == {}):
             print "Error on joining contents"
             sys.exit(1)
+    elif(len(contents) == 1):
+        content = contents[0]
+    else:
+        print "No input TI-TXT file!"
+        sys.exit(1)
 
     # try to fill the data
     if((options.start_addr != None) and (options.end_addr != None)):
@@ -475,9 +2320,10 @@ if __name__ == '__main__':
     if(options.out_file_name != None):
         if(options.verbose == True):
             ti_txt.debug_print_content(full_content)
-        res = ti_txt.print_ti_txt(options.out_file_name, full_content)
+        res = ti_txt.print_file(options.out_file_name, full_content,
+            options.out_format, options.upper_case)
         if (res != True):
-            print "Failed to write output filled TI-TXT file!"
+            print "Failed to write output file!"
             sys.exit(1)
 
     # exit